@@ -10,6 +10,21 @@ import jwt
 from flask import Flask, request, jsonify
 import threading
 import time
+import operator
+import sys
+import queue
+import multiprocessing
+import functools
+import hashlib
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import instrumentation
+import serving
+import batching
+import types
+import statistics
+import json
+import os
+import subprocess
 
 # Constants
 MAX_MEMORY_SIZE = 1000000
@@ -19,6 +34,16 @@ GAMMA = 0.99
 EPSILON = 0.1
 NUM_ITERATIONS = 1000000
 JWT_SECRET = "your_secret_key"
+NUM_ACTORS = 0  # > 0 runs traversal in actor processes alongside the learner
+MODEL_WEIGHTS_PATH = "itinerary.weights.h5"
+SERVE_BIND = "0.0.0.0:5001"
+MAX_TOKENS = 10000
+SEQUENCE_LENGTH = 20
+NUM_PREFERENCES = 100
+EMBEDDING_CACHE_SIZE = 100000  # destinations kept encoded in memory
+PREP_STATE_DIR = "data_prep"
+EVAL_ENVS = 64  # environments stepped in lockstep during evaluation
+EVAL_TOLERANCE = 0.05  # stop once the reward difference CI half-width is below this
 
 # Network Architecture Sub-Team
 class DeepNeuralNetwork(keras.Model):
@@ -56,117 +81,653 @@ class DeepNeuralNetwork(keras.Model):
         return self.output(x)
 
 # Data Preparation Sub-Team
+class EmbeddingCache(batching.LRUCache):
+    # LRU of destination encodings keyed by the destination string, persisted
+    # to one .npz so encodings survive restarts. get_many encodes all misses
+    # with a single call to encode_fn.
+    def __init__(self, encode_fn, maxsize=EMBEDDING_CACHE_SIZE, path=None):
+        super().__init__(maxsize)
+        self.encode_fn = encode_fn
+        self.path = path
+        if path and os.path.exists(path):
+            self.load()
+
+    def get_many(self, destinations):
+        unique = list(dict.fromkeys(destinations))
+        values = dict(zip(unique, super().get_many(unique)))
+        missing = sorted(destination for destination, value in values.items() if value is None)
+        if missing:
+            encoded = np.asarray(self.encode_fn(tf.constant(missing)))
+            self.put_many(missing, encoded)
+            values.update(zip(missing, encoded))
+        return np.stack([values[destination] for destination in destinations])
+
+    def save(self):
+        items = self.items()
+        keys = np.array([key for key, _ in items], dtype=object)
+        values = np.stack([value for _, value in items]) if items else np.empty((0, 0), np.int64)
+        tmp_path = self.path + ".tmp.npz"
+        np.savez(tmp_path, keys=keys, values=values)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        with np.load(self.path, allow_pickle=True) as data:
+            self.put_many(data['keys'].tolist(), data['values'])
+
 class DataPreparation:
-    def __init__(self):
-        self.scaler = StandardScaler()
-        self.destination_encoder = keras.layers.experimental.preprocessing.TextVectorization(max_tokens=10000, output_sequence_length=20)
-        self.preference_encoder = keras.layers.experimental.preprocessing.CategoryEncoding(max_tokens=100)
+    # Pure-tensor preprocessing: destination strings -> token ids, preference
+    # ids -> multi-hot, concatenated and normalized. The vocabulary and the
+    # normalization statistics are adapted once and persisted to state_dir;
+    # training (prepare_dataset) and serving (transform_batch) run the same
+    # compiled transform.
+    def __init__(self, state_dir=None, cache_size=EMBEDDING_CACHE_SIZE):
+        self.state_dir = state_dir
+        self.destination_encoder = keras.layers.TextVectorization(max_tokens=MAX_TOKENS, output_sequence_length=SEQUENCE_LENGTH)
+        self.preference_encoder = keras.layers.CategoryEncoding(num_tokens=NUM_PREFERENCES, output_mode='multi_hot')
+        self.normalizer = None
+        self.encode_destinations = tf.function(self.destination_encoder, reduce_retracing=True)
+        self.combine = tf.function(self._combine, reduce_retracing=True)
+        self.transform = tf.function(lambda destinations, preferences: self._combine(self.destination_encoder(destinations), preferences),
+                                     reduce_retracing=True)
+        cache_path = os.path.join(state_dir, "destinations.npz") if state_dir else None
+        self.embedding_cache = EmbeddingCache(self.encode_destinations, cache_size, cache_path)
+        if state_dir and os.path.exists(os.path.join(state_dir, "vocabulary.json")):
+            self.load()
+
+    @property
+    def adapted(self):
+        return self.normalizer is not None
+
+    def _combine(self, destination_ids, preferences):
+        features = tf.concat([tf.cast(destination_ids, tf.float32), self.preference_encoder(preferences)], axis=-1)
+        return self.normalizer(features)
 
+    def adapt(self, destinations, preferences):
+        self.destination_encoder.adapt(destinations)
+        self.embedding_cache.clear()  # encodings from the old vocabulary
+        features = tf.concat([
+            tf.cast(self.destination_encoder(tf.constant(destinations)), tf.float32),
+            self.preference_encoder(tf.constant(preferences)),
+        ], axis=-1)
+        self.normalizer = keras.layers.Normalization()
+        self.normalizer.adapt(features)
+        if self.state_dir:
+            self.save()
 
-    # Implement embedding creation logic
     def create_embeddings(self, destinations, preferences):
-        dest_embeddings = self.destination_encoder(destinations)
-        pref_embeddings = self.preference_encoder(preferences)
+        dest_embeddings = self.embedding_cache.get_many(list(destinations))
+        pref_embeddings = self.preference_encoder(tf.constant(preferences))
         return dest_embeddings, pref_embeddings
 
-    # Implement data preprocessing logic
-    def preprocess_data(self, data):
-        numerical_data = data.select_dtypes(include=[np.number])
-        categorical_data = data.select_dtypes(exclude=[np.number])
-        
-        scaled_numerical = self.scaler.fit_transform(numerical_data)
-        encoded_categorical = pd.get_dummies(categorical_data)
-        
-        return np.hstack([scaled_numerical, encoded_categorical])
-    
-    def prepare_dataset(self, destinations, preferences, labels):
-        dest_emb, pref_emb = self.create_embeddings(destinations, preferences)
-        features = self.preprocess_data(pd.concat([dest_emb, pref_emb], axis=1))
-    
-        return tf.data.Dataset.from_tensor_slices((features, labels)).batch(BATCH_SIZE)
+    # Serving path: cached destination encodings + the compiled combine step
+    def transform_batch(self, destinations, preferences):
+        destination_ids = self.embedding_cache.get_many(list(destinations))
+        return self.combine(tf.constant(destination_ids), tf.constant(preferences))
+
+    def prepare_dataset(self, destinations, preferences, labels, num_shards=1, shard_index=0, cache_path=None):
+        if not self.adapted:
+            self.adapt(destinations, preferences)
+        dataset = tf.data.Dataset.from_tensor_slices((destinations, preferences, labels))
+        if num_shards > 1:
+            dataset = dataset.shard(num_shards, shard_index)
+        return (dataset
+                .batch(BATCH_SIZE)
+                .map(lambda d, p, y: (self.transform(d, p), y), num_parallel_calls=tf.data.AUTOTUNE)
+                .cache(cache_path or "")
+                .prefetch(tf.data.AUTOTUNE))
+
+    def save(self):
+        os.makedirs(self.state_dir, exist_ok=True)
+        state = {
+            'vocabulary': [str(token) for token in self.destination_encoder.get_vocabulary()],
+            'mean': np.asarray(self.normalizer.mean).ravel().tolist(),
+            'variance': np.asarray(self.normalizer.variance).ravel().tolist(),
+        }
+        path = os.path.join(self.state_dir, "vocabulary.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f)
+        os.replace(path + ".tmp", path)
+        if self.embedding_cache.path:
+            self.embedding_cache.save()
+
+    def load(self):
+        with open(os.path.join(self.state_dir, "vocabulary.json")) as f:
+            state = json.load(f)
+        self.destination_encoder.set_vocabulary(state['vocabulary'])
+        self.normalizer = keras.layers.Normalization(mean=state['mean'], variance=state['variance'])
 
 # Memory Management Sub-Team
+class SegmentTree:
+    # Binary tree over `capacity` leaves stored in one contiguous array.
+    # Node 1 is the root, node i has children 2i and 2i + 1 and leaves
+    # start at `self.capacity`, so every update and query is O(log n).
+    def __init__(self, capacity, operation, scalar_operation, neutral_element):
+        self.capacity = 1 << max(0, int(capacity - 1).bit_length())
+        self.operation = operation
+        self.scalar_operation = scalar_operation
+        self.neutral_element = neutral_element
+        self.tree = np.full(2 * self.capacity, neutral_element, dtype=np.float64)
+
+    def __getitem__(self, indices):
+        return self.tree[self.capacity + np.asarray(indices)]
+
+    def update(self, indices, values):
+        if np.isscalar(indices):
+            self._update_one(int(indices), float(values))
+            return
+        nodes = np.asarray(indices, dtype=np.int64) + self.capacity
+        if not nodes.size:
+            return
+        self.tree[nodes] = values
+        # Walk all touched paths up one level at a time; sorted unique parents
+        # stay sorted after the shift, so dedup is a neighbour comparison
+        nodes = np.unique(nodes) >> 1
+        while nodes[0] >= 1:
+            nodes = nodes[np.concatenate(([True], nodes[1:] != nodes[:-1]))]
+            self.tree[nodes] = self.operation(self.tree[2 * nodes], self.tree[2 * nodes + 1])
+            nodes >>= 1
+
+    def _update_one(self, index, value):
+        tree = self.tree
+        node = index + self.capacity
+        tree[node] = value
+        node >>= 1
+        while node >= 1:
+            tree[node] = self.scalar_operation(tree[2 * node], tree[2 * node + 1])
+            node >>= 1
+
+    def reduce(self):
+        return self.tree[1]
+
+class SumTree(SegmentTree):
+    def __init__(self, capacity):
+        super(SumTree, self).__init__(capacity, np.add, operator.add, 0.0)
+
+    def total(self):
+        return self.tree[1]
+
+    # Descend from the root for a whole batch of prefix sums at once
+    def find_prefixsum_idx(self, prefixsums):
+        prefixsums = np.array(prefixsums, dtype=np.float64)
+        nodes = np.ones(len(prefixsums), dtype=np.int64)
+        if not nodes.size:
+            return nodes
+        while nodes[0] < self.capacity:
+            left = 2 * nodes
+            left_sums = self.tree[left]
+            go_right = prefixsums > left_sums
+            prefixsums = np.where(go_right, prefixsums - left_sums, prefixsums)
+            nodes = np.where(go_right, left + 1, left)
+        return nodes - self.capacity
+
+class MinTree(SegmentTree):
+    def __init__(self, capacity):
+        super(MinTree, self).__init__(capacity, np.minimum, min, np.inf)
+
+    def min(self):
+        return self.tree[1]
+
+class MaxTree(SegmentTree):
+    def __init__(self, capacity):
+        super(MaxTree, self).__init__(capacity, np.maximum, max, 0.0)
+
+    def max(self):
+        return self.tree[1]
+
+class ExperienceBatch:
+    # Sampled experiences as ready-to-use column arrays. Still indexes and
+    # iterates like the list of (state, action, reward, next_state, done)
+    # tuples returned by list storage, so existing callers keep working.
+    def __init__(self, states, actions, rewards, next_states, dones):
+        self.states = states
+        self.actions = actions
+        self.rewards = rewards
+        self.next_states = next_states
+        self.dones = dones
+
+    @classmethod
+    def from_tuples(cls, samples):
+        states, actions, rewards, next_states, dones = zip(*samples)
+        return cls(np.array(states, dtype=np.float32), np.array(actions, dtype=np.int64),
+                   np.array(rewards, dtype=np.float32), np.array(next_states, dtype=np.float32),
+                   np.array(dones, dtype=np.float32))
+
+    def columns(self):
+        return self.states, self.actions, self.rewards, self.next_states, self.dones
+
+    def __len__(self):
+        return len(self.actions)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return ExperienceBatch(*(column[idx] for column in self.columns()))
+        return tuple(column[idx] for column in self.columns())
+
+    def __iter__(self):
+        return (self[idx] for idx in range(len(self)))
+
+class ColumnarStorage:
+    # Ring of preallocated NumPy columns written in place. Columns are sized
+    # from the first experience. States can be kept as float16, or as uint8
+    # quantized over `state_range`, and are decoded to float32 on gather.
+    COLUMNS = ('states', 'actions', 'rewards', 'next_states', 'dones')
+
+    def __init__(self, max_size, state_compression=None, state_range=(0.0, 1.0)):
+        if state_compression not in (None, 'float16', 'uint8'):
+            raise ValueError(f"Unknown state compression: {state_compression}")
+        self.max_size = max_size
+        self.state_compression = state_compression
+        self.state_low, self.state_high = state_range
+        self.columns = None
+
+    def _allocate(self, experience):
+        state_dtype = {None: np.float32, 'float16': np.float16, 'uint8': np.uint8}[self.state_compression]
+        dtypes = (state_dtype, np.int64, np.float32, state_dtype, np.float32)
+        self.columns = {
+            name: np.zeros((self.max_size,) + np.shape(value), dtype=dtype)
+            for name, value, dtype in zip(self.COLUMNS, experience, dtypes)
+        }
+
+    def _encode_states(self, states):
+        if self.state_compression == 'uint8':
+            scaled = (np.asarray(states, dtype=np.float32) - self.state_low) / (self.state_high - self.state_low)
+            return np.rint(np.clip(scaled, 0.0, 1.0) * 255)
+        return states
+
+    def _decode_states(self, states):
+        if self.state_compression == 'uint8':
+            return states.astype(np.float32) * ((self.state_high - self.state_low) / 255) + self.state_low
+        return states.astype(np.float32, copy=False)
+
+    def write(self, indices, experiences):
+        if self.columns is None:
+            self._allocate(experiences[0])
+        if isinstance(experiences, ExperienceBatch):
+            columns = experiences.columns()
+        else:
+            columns = zip(*experiences)
+        for name, values in zip(self.COLUMNS, columns):
+            if name in ('states', 'next_states'):
+                values = self._encode_states(values)
+            self.columns[name][indices] = values
+
+    def gather(self, indices):
+        columns = self.columns
+        return ExperienceBatch(
+            self._decode_states(columns['states'][indices]),
+            columns['actions'][indices],
+            columns['rewards'][indices],
+            self._decode_states(columns['next_states'][indices]),
+            columns['dones'][indices],
+        )
+
+    def nbytes(self):
+        if self.columns is None:
+            return {name: 0 for name in self.COLUMNS}
+        return {name: column.nbytes for name, column in self.columns.items()}
+
 class PrioritizedReplayBuffer:
-    def __init__(self, max_size, alpha=0.6, beta=0.4):
-        self.buffer = deque(maxlen=max_size)
-        self.priorities = deque(maxlen=max_size)
+    def __init__(self, max_size, alpha=0.6, beta=0.4, storage='list', state_compression=None, state_range=(0.0, 1.0)):
+        if storage not in ('list', 'columnar'):
+            raise ValueError(f"Unknown storage mode: {storage}")
+        self.max_size = max_size
+        self.storage = storage
+        self.buffer = [] if storage == 'list' else ColumnarStorage(max_size, state_compression, state_range)
+        self.size = 0
+        self.position = 0
         self.alpha = alpha
         self.beta = beta
         self.epsilon = 1e-6
-        self.max_priority = 1.0
+        # Trees hold priority ** alpha for sampling and importance weights,
+        # the max tree holds raw priorities for new experiences
+        self.sum_tree = SumTree(max_size)
+        self.min_tree = MinTree(max_size)
+        self.max_tree = MaxTree(max_size)
+        # Sampling and priority updates may run on prefetch/updater threads
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def max_priority(self):
+        return self.max_tree.max() if self.size else 1.0
 
     def add(self, experience):
-        self.buffer.append(experience)
-        self.priorities.append(self.max_priority)
+        with self.lock:
+            priority = self.max_priority
+            if self.storage == 'columnar':
+                self.buffer.write([self.position], [experience])
+            elif self.size < self.max_size:
+                self.buffer.append(experience)
+            else:
+                self.buffer[self.position] = experience
+            self.sum_tree.update(self.position, priority ** self.alpha)
+            self.min_tree.update(self.position, priority ** self.alpha)
+            self.max_tree.update(self.position, priority)
+            self.position = (self.position + 1) % self.max_size
+            self.size = min(self.size + 1, self.max_size)
+
+    def add_batch(self, experiences):
+        with self.lock:
+            if not isinstance(experiences, ExperienceBatch):
+                experiences = list(experiences)
+            experiences = experiences[-self.max_size:]
+            if not len(experiences):
+                return
+            priority = self.max_priority
+            indices = (self.position + np.arange(len(experiences))) % self.max_size
+            if self.storage == 'columnar':
+                self.buffer.write(indices, experiences)
+            else:
+                for idx, experience in zip(indices, experiences):
+                    if idx < len(self.buffer):
+                        self.buffer[idx] = experience
+                    else:
+                        self.buffer.append(experience)
+            self.sum_tree.update(indices, priority ** self.alpha)
+            self.min_tree.update(indices, priority ** self.alpha)
+            self.max_tree.update(indices, priority)
+            self.position = int(indices[-1] + 1) % self.max_size
+            self.size = min(self.size + len(experiences), self.max_size)
 
+    @instrumentation.timed('replay_sample_seconds', "PrioritizedReplayBuffer.sample latency")
     def sample(self, batch_size):
-        probs = np.array(self.priorities) ** self.alpha
-        probs /= probs.sum()
+        with self.lock:
+            size = self.size
+            total = self.sum_tree.total()
 
-        indices = np.random.choice(len(self.buffer), batch_size, p=probs)
-        samples = [self.buffer[idx] for idx in indices]
+            # Stratified sampling: one draw from each of batch_size equal segments
+            segment = total / max(batch_size, 1)
+            prefixsums = (np.arange(batch_size) + np.random.rand(batch_size)) * segment
+            indices = np.minimum(self.sum_tree.find_prefixsum_idx(prefixsums), size - 1)
+            if self.storage == 'columnar':
+                samples = self.buffer.gather(indices)
+            else:
+                samples = [self.buffer[idx] for idx in indices]
 
-        weights = (len(self.buffer) * probs[indices]) ** (-self.beta)
-        weights /= weights.max()
+            probs = self.sum_tree[indices] / total
+            max_weight = (size * self.min_tree.min() / total) ** (-self.beta)
+            weights = (size * probs) ** (-self.beta) / max_weight
 
-        return samples, indices, weights
+            return samples, indices, weights
 
     def update_priorities(self, indices, td_errors):
-        for idx, td_error in zip(indices, td_errors):
-            self.priorities[idx] = (abs(td_error) + self.epsilon) ** self.alpha
-            self.max_priority = max(self.max_priority, self.priorities[idx])
+        with self.lock:
+            indices = np.asarray(indices, dtype=np.int64)
+            priorities = np.abs(np.asarray(td_errors, dtype=np.float64).reshape(-1)) + self.epsilon
+            self.sum_tree.update(indices, priorities ** self.alpha)
+            self.min_tree.update(indices, priorities ** self.alpha)
+            self.max_tree.update(indices, priorities)
+
+    def memory_report(self):
+        trees = self.sum_tree.tree.nbytes + self.min_tree.tree.nbytes + self.max_tree.tree.nbytes
+        if self.storage == 'columnar':
+            experiences = self.buffer.nbytes()
+        else:
+            # Tuples and their elements are separate objects; extrapolate from one
+            sample = self.buffer[0] if self.buffer else ()
+            per_item = sys.getsizeof(sample) + sum(sys.getsizeof(value) for value in sample)
+            experiences = {'list': sys.getsizeof(self.buffer), 'objects': per_item * self.size}
+        return {
+            'storage': self.storage,
+            'size': self.size,
+            'capacity': self.max_size,
+            'experiences': experiences,
+            'trees': trees,
+            'total': trees + sum(experiences.values()),
+        }
 
 # Training Pipeline Sub-Team
+class ReplayPrefetcher:
+    # Samples and converts batch N+1 on a background thread while the
+    # learner is still computing step N. A failure on the thread is handed
+    # through the queue and raised again by get().
+    def __init__(self, memory, batch_size, depth=2, timeout=1.0):
+        self.memory = memory
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=depth)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._produce, daemon=True)
+
+    def _produce(self):
+        try:
+            while not self.stop_event.is_set():
+                samples, indices, weights = self.memory.sample(self.batch_size)
+                if not isinstance(samples, ExperienceBatch):
+                    samples = ExperienceBatch.from_tuples(samples)
+                batch = tuple(tf.convert_to_tensor(column) for column in samples.columns())
+                batch += (tf.convert_to_tensor(weights, dtype=tf.float32),)
+                self._put((batch, indices))
+        except Exception as e:
+            self._put(e)
+
+    def _put(self, item):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def get(self):
+        while True:
+            try:
+                item = self.queue.get(timeout=self.timeout)
+            except queue.Empty:
+                if not self.thread.is_alive():
+                    raise RuntimeError("Replay prefetch thread exited without producing a batch")
+                continue
+            if isinstance(item, Exception):
+                raise item
+            return item
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+class PriorityUpdater:
+    # Collects TD errors from the learner and applies them to the replay
+    # buffer in bulk, so reading results back never blocks the next step.
+    # A failed update is kept and raised on the learner's next put/stop.
+    def __init__(self, memory):
+        self.memory = memory
+        self.queue = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self._consume, daemon=True)
+
+    def _consume(self):
+        done = False
+        while not done:
+            pending = [self.queue.get()]
+            while True:
+                try:
+                    pending.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if pending[-1] is None:
+                pending.pop()
+                done = True
+            if pending and self.error is None:
+                try:
+                    indices = np.concatenate([indices for indices, _ in pending])
+                    td_errors = np.concatenate([np.asarray(td_errors) for _, td_errors in pending])
+                    self.memory.update_priorities(indices, td_errors)
+                except Exception as e:
+                    self.error = e
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def put(self, indices, td_errors):
+        self._raise_error()
+        self.queue.put((indices, td_errors))
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+        self._raise_error()
+
 class LinearCFR:
-    def __init__(self, model, memory, optimizer):
+    def __init__(self, model, memory, optimizer, compiled=False, jit_compile=False, prefetch_depth=2):
         self.model = model
         self.memory = memory
         self.optimizer = optimizer
         self.target_model = keras.models.clone_model(model)
         self.target_model.set_weights(model.get_weights())
+        self.compiled = compiled
+        self.prefetch_depth = prefetch_depth
+        if compiled:
+            self.train_step = tf.function(self._train_step, jit_compile=jit_compile)
+        else:
+            self.train_step = self._train_step
 
-    def train(self, num_iterations):
-        for t in range(num_iterations):
-            samples, indices, weights = self.memory.sample(BATCH_SIZE)
-            states, actions, rewards, next_states, dones = zip(*samples)
-            
-            states = np.array(states)
-            next_states = np.array(next_states)
-            rewards = np.array(rewards)
-            actions = np.array(actions)
-            dones = np.array(dones)
-            weights = np.array(weights)
+    def _train_step(self, states, actions, rewards, next_states, dones, weights):
+        with tf.GradientTape() as tape:
+            q_values = self.model(states, training=True)
+            next_q_values = self.target_model(next_states, training=False)
+
+            target_q_values = rewards + (1 - dones) * GAMMA * tf.reduce_max(next_q_values, axis=1)
+            target_q_values = tf.stop_gradient(target_q_values)
+
+            masks = tf.one_hot(actions, tf.shape(q_values)[-1])
+            q_action = tf.reduce_sum(tf.multiply(q_values, masks), axis=1)
 
-            with tf.GradientTape() as tape:
-                q_values = self.model(states, training=True)
-                next_q_values = self.target_model(next_states, training=False)
+            td_errors = target_q_values - q_action
+            loss = tf.reduce_mean(weights * tf.square(td_errors))
 
-                target_q_values = rewards + (1 - dones) * GAMMA * tf.reduce_max(next_q_values, axis=1)
-                target_q_values = tf.stop_gradient(target_q_values)
+        grads = tape.gradient(loss, self.model.trainable_variables)
+        grads, _ = tf.clip_by_global_norm(grads, 5.0)
+        self.optimizer.apply_gradients(zip(grads, self.model.trainable_variables))
+        return loss, td_errors
 
-                masks = tf.one_hot(actions, self.model.output.shape[-1])
-                q_action = tf.reduce_sum(tf.multiply(q_values, masks), axis=1)
+    def train(self, num_iterations):
+        if self.compiled:
+            return self._train_pipelined(num_iterations)
 
-                td_errors = target_q_values - q_action
-                loss = tf.reduce_mean(weights * tf.square(td_errors))
+        for t in range(num_iterations):
+            with instrumentation.timer('cfr_train_step_seconds', "LinearCFR training step latency", mode='eager'):
+                samples, indices, weights = self.memory.sample(BATCH_SIZE)
+                if not isinstance(samples, ExperienceBatch):
+                    samples = ExperienceBatch.from_tuples(samples)
+                states, actions, rewards, next_states, dones = samples.columns()
+                weights = np.asarray(weights, dtype=np.float32)
 
-            grads = tape.gradient(loss, self.model.trainable_variables)
-            grads, _ = tf.clip_by_global_norm(grads, 5.0)
-            self.optimizer.apply_gradients(zip(grads, self.model.trainable_variables))
+                loss, td_errors = self.train_step(states, actions, rewards, next_states, dones, weights)
 
-            self.memory.update_priorities(indices, td_errors.numpy())
+                self.memory.update_priorities(indices, td_errors.numpy())
 
             if t % 100 == 0:
                 self.target_model.set_weights(self.model.get_weights())
 
         return loss.numpy()
 
+    def _train_pipelined(self, num_iterations):
+        prefetcher = ReplayPrefetcher(self.memory, BATCH_SIZE, self.prefetch_depth).start()
+        updater = PriorityUpdater(self.memory).start()
+        try:
+            for t in range(num_iterations):
+                # Steps are dispatched asynchronously, so this is the step rate
+                # the pipeline sustains rather than a single step's latency
+                with instrumentation.timer('cfr_train_step_seconds', "LinearCFR training step latency", mode='pipelined'):
+                    batch, indices = prefetcher.get()
+                    loss, td_errors = self.train_step(*batch)
+                    updater.put(indices, td_errors)
+
+                if t % 100 == 0:
+                    self.target_model.set_weights(self.model.get_weights())
+        finally:
+            prefetcher.stop()
+            updater.stop()
+
+        return loss.numpy()
+
 # Traversal and Sampling Sub-Team
+# Transposition cache key: a hash of the state bytes, dtype and shape
+def state_key(state):
+    state = np.ascontiguousarray(state)
+    digest = hashlib.blake2b(state.tobytes(), digest_size=16)
+    digest.update(str((state.dtype.str, state.shape)).encode())
+    return digest.digest()
+
+class ExternalSampler:
+    # Iterative depth-limited external sampling. Every root expands
+    # `num_samples` sampled paths level by level (no Python recursion), and
+    # all leaves are valued with one batched model call behind the cache.
+    # Uses env.simulate(state, action) when available so frontier states can
+    # be stepped independently; otherwise falls back to env.step(action).
+    def __init__(self, model, env, cache_size=100000, num_samples=1):
+        self.model = model
+        self.env = env
+        self.cache = batching.LRUCache(cache_size)
+        self.num_samples = num_samples
+
+    def _step(self, state, action):
+        simulate = getattr(self.env, 'simulate', None)
+        if simulate is not None:
+            return simulate(state, action)
+        return self.env.step(action)
+
+    def evaluate(self, states, depth):
+        states = np.asarray(states)
+        num_roots = len(states)
+        owners = np.repeat(np.arange(num_roots), self.num_samples)
+        frontier = list(np.repeat(states, self.num_samples, axis=0))
+        returns = np.zeros(len(frontier))
+        discounts = np.ones(len(frontier))
+        paths = np.arange(len(frontier))
+        leaf_paths, leaf_states = [], []
+
+        for level in range(depth + 1):
+            next_paths, next_frontier = [], []
+            for path, state in zip(paths, frontier):
+                if level == depth or self.env.is_terminal(state):
+                    leaf_paths.append(path)
+                    leaf_states.append(state)
+                    continue
+                next_state, reward, _, _ = self._step(state, self.env.action_space.sample())
+                returns[path] += discounts[path] * reward
+                discounts[path] *= GAMMA
+                next_paths.append(path)
+                next_frontier.append(next_state)
+            if not next_paths:
+                break
+            paths, frontier = next_paths, next_frontier
+
+        leaf_values = self._leaf_values(leaf_states)
+        values = returns[leaf_paths, np.newaxis] + discounts[leaf_paths, np.newaxis] * leaf_values
+        totals = np.zeros((num_roots, values.shape[1]))
+        np.add.at(totals, owners[leaf_paths], values)
+        return totals / self.num_samples
+
+    def _leaf_values(self, leaf_states):
+        keys = [state_key(state) for state in leaf_states]
+        unique_states = dict(zip(keys, leaf_states))
+        values = {key: self.cache.get(key) for key in unique_states}
+        missing = [key for key, value in values.items() if value is None]
+        if missing:
+            q_values = np.asarray(self.model(np.stack([unique_states[key] for key in missing]), training=False))
+            self.cache.put_many(missing, q_values)
+            values.update(zip(missing, q_values))
+        return np.stack([values[key] for key in keys])
+
 class GameTreeTraversal:
-    def __init__(self, model, memory, env):
+    def __init__(self, model, memory, env, cache_size=100000):
         self.model = model
         self.memory = memory
         self.env = env
+        self.sampler = ExternalSampler(model, env, cache_size)
 
     def traverse(self, num_traversals):
         for _ in range(num_traversals):
@@ -183,65 +744,664 @@ class GameTreeTraversal:
                 self.memory.add((state, action, reward, next_state, done))
                 state = next_state
 
+    # Run all envs in lockstep: one batched forward pass per tick and one
+    # bulk insert into the replay buffer instead of per-state model calls
+    def traverse_vectorized(self, envs, num_traversals):
+        start = time.perf_counter()
+        states = [env.reset() for env in envs[:num_traversals]]
+        active = list(range(len(states)))
+        started = len(active)
+        transitions = 0
+
+        while active:
+            q_values = np.asarray(self.model(np.stack([states[i] for i in active]), training=False))
+            actions = q_values.argmax(axis=1)
+            explore = np.random.rand(len(active)) < EPSILON
+            actions[explore] = np.random.randint(q_values.shape[1], size=int(explore.sum()))
+
+            experiences = []
+            next_active = []
+            for i, action in zip(active, actions):
+                next_state, reward, done, _ = envs[i].step(action)
+                experiences.append((states[i], action, reward, next_state, done))
+                if not done:
+                    states[i] = next_state
+                    next_active.append(i)
+                elif started < num_traversals:
+                    states[i] = envs[i].reset()
+                    started += 1
+                    next_active.append(i)
+
+            self.memory.add_batch(experiences)
+            transitions += len(experiences)
+            active = next_active
+
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            'episodes': started,
+            'transitions': transitions,
+            'seconds': elapsed,
+            'transitions_per_sec': transitions / elapsed if elapsed > 0 else 0.0,
+        }
+        return self.stats
+
     def external_sampling(self, state, depth):
-        if depth == 0 or self.env.is_terminal(state):
-            return self.model(state[np.newaxis])[0].numpy()
+        return self.sampler.evaluate(state[np.newaxis], depth)[0]
 
-        action = self.env.action_space.sample()
-        next_state, reward, done, _ = self.env.step(action)
-        q_values = reward + GAMMA * self.external_sampling(next_state, depth - 1)
+# Distributed Training Sub-Team
+class ExperienceRecorder:
+    # Stands in for the replay buffer inside an actor; collects transitions
+    # so they can be shipped to the learner as one columnar chunk
+    def __init__(self):
+        self.experiences = []
+
+    def add(self, experience):
+        self.experiences.append(experience)
+
+    def add_batch(self, experiences):
+        self.experiences.extend(experiences)
 
-        return q_values
+    def drain(self):
+        batch = ExperienceBatch.from_tuples(self.experiences)
+        self.experiences = []
+        return batch
+
+def _actor_worker(actor_id, model_fn, env_fn, envs_per_actor, chunk_traversals, experience_queue, weights_queue, stop_event):
+    tf.config.threading.set_intra_op_parallelism_threads(1)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    model = model_fn()
+    recorder = ExperienceRecorder()
+    traversal = GameTreeTraversal(model, recorder, None)
+    envs = [env_fn(actor_id * envs_per_actor + i) for i in range(envs_per_actor)]
+    version = -1
+
+    while not stop_event.is_set():
+        # Always act with the newest weights the learner has broadcast
+        try:
+            while True:
+                version, weights = weights_queue.get(timeout=0.1 if version < 0 else 0)
+                model.set_weights(weights)
+        except queue.Empty:
+            if version < 0:
+                continue
+
+        traversal.traverse_vectorized(envs, chunk_traversals)
+        chunk = (actor_id, version, recorder.drain().columns())
+        while not stop_event.is_set():
+            try:
+                experience_queue.put(chunk, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+
+class ActorLearner:
+    # Actor processes run GameTreeTraversal on local model copies and stream
+    # experience chunks to this (learner) process, which owns the replay
+    # buffer and LinearCFR, and periodically broadcasts new weights.
+    # model_fn and env_fn must be picklable top-level callables.
+    def __init__(self, cfr, model_fn, env_fn, num_actors=2, envs_per_actor=8, chunk_traversals=8,
+                 train_steps_per_round=10, broadcast_interval=100, mp_context='spawn'):
+        self.cfr = cfr
+        self.memory = cfr.memory
+        self.model_fn = model_fn
+        self.env_fn = env_fn
+        self.num_actors = num_actors
+        self.envs_per_actor = envs_per_actor
+        self.chunk_traversals = chunk_traversals
+        self.train_steps_per_round = train_steps_per_round
+        self.broadcast_interval = broadcast_interval
+        self.ctx = multiprocessing.get_context(mp_context)
+        self.actors = []
+        self.weight_version = 0
+        self.train_steps = 0
+        self.transitions = 0
+        self.transitions_by_actor = [0] * num_actors
+        self.staleness = deque(maxlen=1000)
+        self.started_at = None
+
+    def start(self):
+        self.stop_event = self.ctx.Event()
+        self.experience_queue = self.ctx.Queue(maxsize=4 * self.num_actors)
+        self.weights_queues = [self.ctx.Queue(maxsize=1) for _ in range(self.num_actors)]
+        for actor_id in range(self.num_actors):
+            actor = self.ctx.Process(
+                target=_actor_worker,
+                args=(actor_id, self.model_fn, self.env_fn, self.envs_per_actor, self.chunk_traversals,
+                      self.experience_queue, self.weights_queues[actor_id], self.stop_event),
+                daemon=True,
+            )
+            actor.start()
+            self.actors.append(actor)
+        self.broadcast()
+        self.started_at = time.perf_counter()
+        return self
+
+    def broadcast(self):
+        weights = self.cfr.model.get_weights()
+        for weights_queue in self.weights_queues:
+            # Replace whatever the actor has not picked up yet
+            try:
+                weights_queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                weights_queue.put_nowait((self.weight_version, weights))
+            except queue.Full:
+                pass
+        self.weight_version += 1
+
+    def ingest(self, timeout=0.0):
+        received = 0
+        try:
+            chunk = self.experience_queue.get(timeout=timeout) if timeout else self.experience_queue.get_nowait()
+            while True:
+                actor_id, version, columns = chunk
+                batch = ExperienceBatch(*columns)
+                self.memory.add_batch(batch)
+                self.transitions += len(batch)
+                self.transitions_by_actor[actor_id] += len(batch)
+                self.staleness.append(self.weight_version - 1 - version)
+                received += len(batch)
+                chunk = self.experience_queue.get_nowait()
+        except queue.Empty:
+            pass
+        return received
+
+    def run(self, num_steps, min_replay_size=BATCH_SIZE):
+        if not self.actors:
+            self.start()
+        steps_since_broadcast = 0
+        while self.train_steps < num_steps:
+            self.ingest(timeout=1.0 if len(self.memory) < min_replay_size else 0.0)
+            if len(self.memory) < min_replay_size:
+                continue
+            self.cfr.train(self.train_steps_per_round)
+            self.train_steps += self.train_steps_per_round
+            steps_since_broadcast += self.train_steps_per_round
+            if steps_since_broadcast >= self.broadcast_interval:
+                self.broadcast()
+                steps_since_broadcast = 0
+        return self.metrics()
+
+    def metrics(self):
+        elapsed = time.perf_counter() - self.started_at if self.started_at else 0.0
+        return {
+            'actors_alive': sum(actor.is_alive() for actor in self.actors),
+            'transitions': self.transitions,
+            'transitions_by_actor': list(self.transitions_by_actor),
+            'transitions_per_sec': self.transitions / elapsed if elapsed else 0.0,
+            'train_steps': self.train_steps,
+            'train_steps_per_sec': self.train_steps / elapsed if elapsed else 0.0,
+            'weight_version': self.weight_version - 1,
+            'staleness_mean': float(np.mean(self.staleness)) if self.staleness else 0.0,
+            'staleness_max': int(max(self.staleness)) if self.staleness else 0,
+        }
+
+    def shutdown(self, timeout=10.0):
+        self.stop_event.set()
+        deadline = time.monotonic() + timeout
+        for actor in self.actors:
+            # Keep draining so actors blocked on a full queue can exit
+            while actor.is_alive() and time.monotonic() < deadline:
+                self.ingest()
+                actor.join(0.1)
+        for actor in self.actors:
+            if actor.is_alive():
+                actor.terminate()
+            actor.join()
+        for q in [self.experience_queue] + self.weights_queues:
+            q.cancel_join_thread()
+            q.close()
+        self.actors = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
 
 # Evaluation Metrics Sub-Team
 class Evaluator:
-    def __init__(self, env):
-        self.env = env
-        
+    # Episodes run on num_envs environments in lockstep with one batched
+    # model call per step, and every model being compared plays the same
+    # seeded episodes (common random numbers), so a paired comparison needs
+    # far fewer episodes than two independent runs. compare_to_baseline stops
+    # as soon as the confidence interval on the mean reward difference is
+    # within tolerance.
+    def __init__(self, env_fn, num_envs=EVAL_ENVS, seed=0):
+        self.env_fn = env_fn
+        self.num_envs = num_envs
+        self.seed = seed
+        self.last_report = None
+
+    # Total reward per (model, seed); every model plays each seed on its own
+    # freshly seeded environment
+    def run_episodes(self, models, seeds):
+        returns = np.zeros((len(models), len(seeds)))
+        for m, model in enumerate(models):
+            envs = [self.env_fn(int(seed)) for seed in seeds]
+            states = np.stack([env.reset() for env in envs]).astype(np.float32)
+            active = np.arange(len(envs))
+            while len(active):
+                q_values = np.asarray(model(states[active], training=False))
+                actions = q_values.argmax(axis=1)
+                still_active = []
+                for i, action in zip(active, actions):
+                    states[i], reward, done, _ = envs[i].step(int(action))
+                    returns[m, i] += reward
+                    if not done:
+                        still_active.append(i)
+                active = np.array(still_active, dtype=np.int64)
+        return returns
+
     # Implement exploitability calculation
     def calculate_exploitability(self, model, num_episodes=1000):
-        total_reward = 0
-        for _ in range(num_episodes):
-            state = self.env.reset()
-            done = False
-            while not done:
-                q_values = model(state[np.newaxis])[0]
-                action = tf.argmax(q_values).numpy()
-                state, reward, done, _ = self.env.step(action)
-                total_reward += reward
-        return total_reward / num_episodes
+        seeds = self.seed + np.arange(num_episodes)
+        returns = np.concatenate([
+            self.run_episodes([model], seeds[start:start + self.num_envs])[0]
+            for start in range(0, num_episodes, self.num_envs)
+        ])
+        return returns.mean()
 
     # Implement baseline comparison
-    def compare_to_baseline(self, model, baseline_model, num_episodes=1000):
-        model_reward = self.calculate_exploitability(model, num_episodes)
-        baseline_reward = self.calculate_exploitability(baseline_model, num_episodes)
-        return model_reward - baseline_reward
+    def compare_to_baseline(self, model, baseline_model, num_episodes=1000, tolerance=EVAL_TOLERANCE,
+                            confidence=0.95, min_episodes=None):
+        z = statistics.NormalDist().inv_cdf((1 + confidence) / 2)
+        min_episodes = min_episodes or self.num_envs
+        differences, model_returns, baseline_returns = [], [], []
+        start_time = time.perf_counter()
+        half_width = np.inf
+        episodes = 0
+        while episodes < num_episodes:
+            seeds = self.seed + np.arange(episodes, min(episodes + self.num_envs, num_episodes))
+            returns = self.run_episodes([model, baseline_model], seeds)
+            model_returns.append(returns[0])
+            baseline_returns.append(returns[1])
+            differences.append(returns[0] - returns[1])
+            episodes += len(seeds)
+            d = np.concatenate(differences)
+            half_width = z * d.std(ddof=1) / np.sqrt(len(d)) if len(d) > 1 else np.inf
+            if episodes >= min_episodes and half_width <= tolerance:
+                break
+        elapsed = time.perf_counter() - start_time
+        d = np.concatenate(differences)
+        self.last_report = {
+            'difference': float(d.mean()),
+            'ci_half_width': float(half_width),
+            'confidence': confidence,
+            'model_reward': float(np.concatenate(model_returns).mean()),
+            'baseline_reward': float(np.concatenate(baseline_returns).mean()),
+            'episodes': episodes,
+            'stopped_early': episodes < num_episodes,
+            'episodes_per_sec': 2 * episodes / elapsed,
+        }
+        return self.last_report['difference']
 
 # Real-Time Data Integration Sub-Team
+_MISSING = object()
+
+class DataSnapshot:
+    # Immutable view of the integrated data: readers take the current
+    # snapshot with a single attribute read, writers publish a new one
+    __slots__ = ('version', 'data', 'key_versions', 'updated_at')
+
+    def __init__(self, version=0, data=None, key_versions=None, updated_at=None):
+        self.version = version
+        self.data = types.MappingProxyType(data or {})
+        self.key_versions = types.MappingProxyType(key_versions or {})
+        self.updated_at = updated_at
+
 class RealTimeDataIntegrator:
-    def __init__(self):
+    # Each source is polled on its own thread with its own interval and
+    # timeout, so one slow source doesn't hold back the others; sources can
+    # also push(). Updates are merged per key: a value is applied only if its
+    # version is newer than the one already held, and only changed keys are
+    # copied into the next snapshot and sent to subscribers. Every newer key
+    # advances its version, even when its value is unchanged.
+    # A source whose previous fetch is still running is skipped rather than
+    # fetched again, so a hung source holds at most one pool worker.
+    def __init__(self, default_interval=60.0, default_timeout=10.0, history=10000):
         self.data_sources = []
-        self.lock = threading.Lock()
-        self.latest_data = {}
+        self.default_interval = default_interval
+        self.default_timeout = default_timeout
+        self.lock = threading.Lock()  # serializes writers only
+        self.snapshot = DataSnapshot()
+        self.subscribers = {}
+        self.notifications = queue.Queue()
+        self.executor = None
+        self.fetches = {}  # source name -> its latest fetch future
+        self.fetch_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.threads = []
+        self.lags = deque(maxlen=history)
+        self.read_latencies = deque(maxlen=history)
+        self.source_stats = {}
+
+    @property
+    def latest_data(self):
+        return self.snapshot.data
+
+    def add_data_source(self, source, interval=None, timeout=None, name=None):
+        name = name or getattr(source, 'name', None) or f"source-{len(self.data_sources)}"
+        self.data_sources.append((name, source, interval or self.default_interval, timeout or self.default_timeout))
+        self.source_stats[name] = {'polls': 0, 'errors': 0, 'timeouts': 0, 'skipped': 0, 'last_success': None}
+
+    # Push-style update; versions default to the observation time, so an
+    # older observation never overwrites a newer one
+    def push(self, data, version=None, observed_at=None, source=None):
+        observed_at = time.time() if observed_at is None else observed_at
+        version = observed_at if version is None else version
+        with self.lock:
+            current = self.snapshot
+            newer = {
+                key: value for key, value in data.items()
+                if version > current.key_versions.get(key, float('-inf'))
+            }
+            if not newer:
+                return current
+            key_versions = {**current.key_versions, **dict.fromkeys(newer, version)}
+            changes = {key: value for key, value in newer.items() if current.data.get(key, _MISSING) != value}
+            if not changes:
+                # Same values at a newer version: only the key versions move,
+                # so a late older value is still rejected
+                self.snapshot = DataSnapshot(current.version, dict(current.data), key_versions, current.updated_at)
+                return self.snapshot
+            now = time.time()
+            snapshot = DataSnapshot(current.version + 1, {**current.data, **changes}, key_versions, now)
+            self.snapshot = snapshot
+        self.lags.append(now - observed_at)
+        if self.subscribers:
+            self.notifications.put((changes, snapshot, source))
+        return snapshot
 
-    def add_data_source(self, source):
-        self.data_sources.append(source)
+    def poll(self, name, source, timeout):
+        stats = self.source_stats[name]
+        observed_at = time.time()
+        with self.fetch_lock:
+            previous = self.fetches.get(name)
+            if previous is not None and not previous.done():
+                stats['skipped'] += 1
+                return None
+            future = self.fetches[name] = self.fetch_pool().submit(source.get_data)
+        stats['polls'] += 1
+        try:
+            data = future.result(timeout)
+        except FutureTimeoutError:
+            stats['timeouts'] += 1
+            return None
+        except Exception:
+            stats['errors'] += 1
+            return None
+        stats['last_success'] = time.time()
+        return self.push(data, observed_at=observed_at, source=name)
+
+    # One worker per source is enough, since each has at most one fetch running
+    def fetch_pool(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=max(4, len(self.data_sources)), thread_name_prefix='source')
+        return self.executor
 
+    # One concurrent pass over every source
     def update_data(self):
-        while True:
-            new_data = {}
-            for source in self.data_sources:
-                new_data.update(source.get_data())
-            with self.lock:
-                self.latest_data = new_data
-            time.sleep(60)  # Update every minute
+        threads = [threading.Thread(target=self.poll, args=(name, source, timeout)) for name, source, _, timeout in self.data_sources]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.snapshot
+
+    def _poll_loop(self, name, source, interval, timeout):
+        while not self.stop_event.is_set():
+            started = time.monotonic()
+            self.poll(name, source, timeout)
+            self.stop_event.wait(max(0.0, interval - (time.monotonic() - started)))
+
+    # Lock-free: returns the current immutable snapshot
+    def get_snapshot(self):
+        return self.snapshot
 
     def get_real_time_data(self):
-        with self.lock:
-            return self.latest_data.copy()
+        start = time.perf_counter()
+        data = self.snapshot.data
+        self.read_latencies.append(time.perf_counter() - start)
+        return data
+
+    # callback(changes, snapshot) runs on the notifier thread; keys limits
+    # notifications to changes touching those keys
+    def subscribe(self, callback, keys=None):
+        token = object()
+        self.subscribers[token] = (callback, frozenset(keys) if keys is not None else None)
+        return token
+
+    def unsubscribe(self, token):
+        self.subscribers.pop(token, None)
+
+    def _notify_loop(self):
+        while not self.stop_event.is_set():
+            try:
+                changes, snapshot, source = self.notifications.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            for callback, keys in list(self.subscribers.values()):
+                relevant = changes if keys is None else {key: value for key, value in changes.items() if key in keys}
+                if not relevant:
+                    continue
+                try:
+                    callback(relevant, snapshot)
+                except Exception as e:
+                    print(f"Subscriber failed on update from {source}: {e}")
 
     def start(self):
-        threading.Thread(target=self.update_data, daemon=True).start()
+        self.stop_event.clear()
+        self.threads = [threading.Thread(target=self._notify_loop, daemon=True)] + [
+            threading.Thread(target=self._poll_loop, args=(name, source, interval, timeout), daemon=True)
+            for name, source, interval, timeout in self.data_sources
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def metrics(self):
+        lags = np.array(self.lags) * 1000 if self.lags else np.zeros(1)
+        reads = np.array(self.read_latencies) * 1e6 if self.read_latencies else np.zeros(1)
+        snapshot = self.snapshot
+        return {
+            'version': snapshot.version,
+            'keys': len(snapshot.data),
+            'update_lag_p50_ms': float(np.percentile(lags, 50)),
+            'update_lag_p99_ms': float(np.percentile(lags, 99)),
+            'read_p50_us': float(np.percentile(reads, 50)),
+            'read_p99_us': float(np.percentile(reads, 99)),
+            'sources': {name: dict(stats) for name, stats in self.source_stats.items()},
+        }
+
+# Inference Serving Sub-Team
+class InferenceEngine(batching.MicroBatcher):
+    # Coalesces concurrent predict() calls into micro-batches (see
+    # batching.MicroBatcher) and runs each batch as one compiled forward
+    # pass. Batches are padded to power-of-two sizes so the compiled function
+    # traces only a few shapes.
+    def __init__(self, model, max_batch_size=64, max_latency_ms=5.0, history=10000):
+        super().__init__(self._forward, max_batch_size, max_latency_ms, history)
+        self.model = model
+        self.predict_fn = tf.function(lambda inputs: model(inputs, training=False), reduce_retracing=True)
+
+    def predict(self, inputs, timeout=None):
+        return self.submit(inputs).result(timeout)
+
+    def _forward(self, items):
+        size = len(items)
+        padded = 1 << (size - 1).bit_length()
+        inputs = tf.nest.map_structure(
+            lambda *column: np.pad(np.stack(column), [(0, padded - size)] + [(0, 0)] * np.ndim(column[0])),
+            *items)
+        return np.asarray(self.predict_fn(inputs))[:size]
+
+# Benchmarking Sub-Team
+class SyntheticEnv:
+    # Deterministic-per-seed random walk with the gym-style API the traversal
+    # and evaluation code expects; stands in for the itinerary environment
+    class ActionSpace:
+        def __init__(self, n, rng):
+            self.n = n
+            self.rng = rng
+
+        def sample(self):
+            return int(self.rng.integers(self.n))
+
+    def __init__(self, state_dim=64, num_actions=10, episode_length=20, seed=None):
+        self.rng = np.random.default_rng(seed)
+        self.action_space = self.ActionSpace(num_actions, self.rng)
+        self.episode_length = episode_length
+        self.transitions = np.random.default_rng(0).normal(scale=0.5, size=(num_actions, state_dim)).astype(np.float32)
+        self.rewards = np.linspace(-1.0, 1.0, num_actions, dtype=np.float32)
+        self.state_dim = state_dim
+        self.state = None
+        self.t = 0
+
+    def reset(self):
+        self.t = 0
+        self.state = self.rng.normal(size=self.state_dim).astype(np.float32)
+        return self.state
+
+    def step(self, action):
+        self.t += 1
+        self.state, reward, _, _ = self.simulate(self.state, action)
+        return self.state, reward, self.t >= self.episode_length, {}
+
+    # Stateless transition used for lookahead from arbitrary states
+    def simulate(self, state, action):
+        next_state = np.tanh(0.9 * state + self.transitions[action])
+        return next_state, float(self.rewards[action] * next_state.mean()), False, {}
+
+    def is_terminal(self, state):
+        return self.t >= self.episode_length
+
+def benchmark_replay_sampling(sizes=(10000, 100000, 1000000), batch_size=BATCH_SIZE, num_samples=1000):
+    results = {}
+    for size in sizes:
+        memory = PrioritizedReplayBuffer(size)
+        memory.add_batch([(i, 0, 0.0, i, False) for i in range(size)])
+        memory.update_priorities(np.arange(size), np.random.rand(size))
+
+        start = time.perf_counter()
+        for _ in range(num_samples):
+            _, indices, _ = memory.sample(batch_size)
+            memory.update_priorities(indices, np.random.rand(batch_size))
+        elapsed = time.perf_counter() - start
+
+        results[size] = elapsed / num_samples * 1e6
+        print(f"size={size:>8} sample+update latency: {results[size]:.1f} us")
+    return results
+
+def benchmark_replay_add(sizes=(10000, 100000, 1000000), chunk_size=1000, storage='columnar'):
+    results = {}
+    for size in sizes:
+        memory = PrioritizedReplayBuffer(size, storage=storage)
+        experiences = [(np.float32(i), 0, 0.0, np.float32(i), False) for i in range(chunk_size)]
+        start = time.perf_counter()
+        for _ in range(size // chunk_size):
+            memory.add_batch(experiences)
+        results[size] = (size // chunk_size) * chunk_size / (time.perf_counter() - start)
+        print(f"size={size:>8} add_batch: {results[size]:.0f} experiences/sec")
+    return results
+
+def build_benchmark_q_network(state_dim, num_actions):
+    return keras.Sequential([
+        keras.Input(shape=(state_dim,)),
+        keras.layers.Dense(256, activation='relu'),
+        keras.layers.Dense(128, activation='relu'),
+        keras.layers.Dense(num_actions),
+    ])
+
+def fill_synthetic_memory(memory, size, state_dim, num_actions):
+    states = np.random.rand(size + 1, state_dim).astype(np.float32)
+    actions = np.random.randint(num_actions, size=size)
+    rewards = np.random.randn(size).astype(np.float32)
+    memory.add_batch(zip(states[:-1], actions, rewards, states[1:], np.random.rand(size) < 0.05))
+    return memory
+
+def benchmark_train_steps(num_steps=500, state_dim=64, num_actions=10, memory_size=100000, jit_compile=False):
+    memory = fill_synthetic_memory(PrioritizedReplayBuffer(memory_size, storage='columnar'), memory_size, state_dim, num_actions)
+    results = {}
+    for mode, compiled in (('eager', False), ('compiled', True)):
+        model = build_benchmark_q_network(state_dim, num_actions)
+        cfr = LinearCFR(model, memory, keras.optimizers.Adam(learning_rate=LEARNING_RATE),
+                        compiled=compiled, jit_compile=jit_compile)
+        cfr.train(10)  # warm up / trace
+        start = time.perf_counter()
+        cfr.train(num_steps)
+        results[mode] = num_steps / (time.perf_counter() - start)
+        print(f"{mode:>8} train steps/sec: {results[mode]:.1f}")
+    return results
+
+def benchmark_traversal(num_envs=(1, 8, 32, 128), num_traversals=256, state_dim=64, num_actions=10):
+    model = build_benchmark_q_network(state_dim, num_actions)
+    results = {}
+    for n in num_envs:
+        memory = PrioritizedReplayBuffer(num_traversals * 20, storage='columnar')
+        traversal = GameTreeTraversal(model, memory, None)
+        envs = [SyntheticEnv(state_dim, num_actions, seed=i) for i in range(n)]
+        results[n] = traversal.traverse_vectorized(envs, num_traversals)['transitions_per_sec']
+        print(f"envs={n:>4} transitions/sec: {results[n]:.0f}")
+    return results
+
+def benchmark_evaluation(num_envs=(1, 16, 64), num_episodes=256, state_dim=64, num_actions=10):
+    model = build_benchmark_q_network(state_dim, num_actions)
+    baseline = build_benchmark_q_network(state_dim, num_actions)
+    env_fn = lambda seed: SyntheticEnv(state_dim, num_actions, seed=seed)
+    results = {}
+    for n in num_envs:
+        evaluator = Evaluator(env_fn, num_envs=n)
+        evaluator.compare_to_baseline(model, baseline, num_episodes=num_episodes, tolerance=0.0)
+        results[n] = evaluator.last_report['episodes_per_sec']
+        print(f"envs={n:>4} episodes/sec: {results[n]:.0f}")
+    return results
+
+def benchmark_inference(num_clients=(1, 16, 64), requests_per_client=200, state_dim=64, num_actions=10):
+    model = build_benchmark_q_network(state_dim, num_actions)
+    states = np.random.rand(requests_per_client, state_dim).astype(np.float32)
+    results = {}
+    for clients in num_clients:
+        for mode in ('per_request', 'micro_batched'):
+            engine = InferenceEngine(model).start() if mode == 'micro_batched' else None
+            latencies = []
+            def client():
+                for state in states:
+                    start = time.perf_counter()
+                    if engine is None:
+                        np.asarray(model(state[np.newaxis], training=False))
+                    else:
+                        engine.predict(state)
+                    latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            threads = [threading.Thread(target=client) for _ in range(clients)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            if engine is not None:
+                engine.stop()
+
+            latencies = np.array(latencies) * 1000
+            results[(clients, mode)] = {
+                'requests_per_sec': len(latencies) / elapsed,
+                'p50_ms': float(np.percentile(latencies, 50)),
+                'p99_ms': float(np.percentile(latencies, 99)),
+            }
+            print(f"clients={clients:>3} {mode:>13}: {results[(clients, mode)]['requests_per_sec']:.0f} req/s, "
+                  f"p50={results[(clients, mode)]['p50_ms']:.2f} ms, p99={results[(clients, mode)]['p99_ms']:.2f} ms")
+    return results
 
 # API Development Sub-Team
 app = Flask(__name__)
@@ -266,6 +1426,7 @@ from flask_jwt_extended import JWTManager, jwt_required, create_access_token
 app = Flask(__name__)
 app.config['JWT_SECRET_KEY'] = 'your-secret-key'  # Change this!
 jwt = JWTManager(app)
+instrumentation.instrument_app(app)
 
 @app.route('/login', methods=['POST'])
 def login():
@@ -285,35 +1446,74 @@ def recommend_itinerary():
     recommended_itinerary = generate_itinerary(user_preferences)
     return jsonify(recommended_itinerary)
 
+@app.route('/recommend/stats', methods=['GET'])
+def recommend_stats():
+    return jsonify(inference_engine.stats() if inference_engine else {})
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    ready = inference_engine is not None and inference_engine.thread.is_alive()
+    return jsonify({"ready": ready}), 200 if ready else 503
+
+# Set in main; shared by all request threads so their model calls are batched
+inference_engine = None
+
 def generate_itinerary(preferences):
     # Implement your itinerary generation logic here
+    destination = np.asarray(preferences['destination'], dtype=np.float32)
+    preference = np.asarray(preferences['preferences'], dtype=np.float32)
+    q_values = inference_engine.predict((destination, preference))
+    return {'actions': np.argsort(-q_values).tolist(), 'scores': q_values.tolist()}
+
+# Actor processes rebuild the model and environments from these factories
+def build_model():
+    return DeepNeuralNetwork((64, 32), 10)  # Example input shapes and num_actions
+
+def make_env(seed):
+    # Implement your itinerary environment creation logic here
     pass
 
-if __name__ == '__main__':
-    app.run(debug=True)
+# Runs in each serving worker after the fork: TensorFlow's runtime isn't
+# fork-safe, so every worker builds its own model from the weights file the
+# training process writes
+def start_inference(weights_path=MODEL_WEIGHTS_PATH):
+    global inference_engine
+    model = build_model()
+    if os.path.exists(weights_path):
+        model.load_weights(weights_path)
+    inference_engine = InferenceEngine(model).start()
+    return inference_engine
+
+if __name__ == '__main__' and sys.argv[1:] == ['serve']:
+    serving.serve(app, SERVE_BIND, post_fork=start_inference)
+    sys.exit(0)
 
 # Main execution
 if __name__ == "__main__":
-    data_prep = DataPreparation()
+    data_prep = DataPreparation(PREP_STATE_DIR)
     memory = ReservoirMemory(MAX_MEMORY_SIZE)
     model = DeepNeuralNetwork((64, 32), 10)  # Example input shapes and num_actions
     optimizer = keras.optimizers.Adam(learning_rate=LEARNING_RATE)
     cfr = LinearCFR(model, memory, optimizer)
     traversal = GameTreeTraversal(model, memory)
-    evaluator = Evaluator()
+    evaluator = Evaluator(make_env)
     real_time_integrator = RealTimeDataIntegrator()
 
     # Training loop
-    for _ in range(NUM_ITERATIONS):
-        state = get_initial_state()  # Implement this function
-        done = False
-        while not done:
-            state, done = traversal.traverse(state)
-        cfr.train(1)
+    if NUM_ACTORS > 0:
+        with ActorLearner(cfr, build_model, make_env, num_actors=NUM_ACTORS) as learner:
+            learner.run(NUM_ITERATIONS)
+    else:
+        for _ in range(NUM_ITERATIONS):
+            state = get_initial_state()  # Implement this function
+            done = False
+            while not done:
+                state, done = traversal.traverse(state)
+            cfr.train(1)
 
-    # Start API server
-    api_thread = threading.Thread(target=app.run)
-    api_thread.start()
+    # Serve from a separate process so training can't starve request handling
+    model.save_weights(MODEL_WEIGHTS_PATH)
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve'])
 
     # Continuous real-time updates and model refinement
     while True:
@@ -322,7 +1522,9 @@ if __name__ == "__main__":
         time.sleep(60)  # Update every minute
 
 import unittest
-from unittest.mock import MagicMock
+import tempfile
+import shutil
+from unittest.mock import MagicMock, patch
 
 class TestItineraryPlanner(unittest.TestCase):
     def setUp(self):
@@ -352,5 +1554,351 @@ class TestItineraryPlanner(unittest.TestCase):
 
     # Add more tests as needed
 
+class TestPrioritizedReplayBuffer(unittest.TestCase):
+    def setUp(self):
+        self.memory = PrioritizedReplayBuffer(1000)
+
+    def test_sum_tree_prefixsum(self):
+        tree = SumTree(5)
+        tree.update(np.arange(5), [1.0, 2.0, 3.0, 4.0, 0.0])
+        self.assertAlmostEqual(tree.total(), 10.0)
+        np.testing.assert_array_equal(tree.find_prefixsum_idx([0.5, 1.5, 3.5, 9.9]), [0, 1, 2, 3])
+        tree.update(0, 5.0)
+        self.assertAlmostEqual(tree.total(), 14.0)
+
+    def test_min_max_trees(self):
+        min_tree, max_tree = MinTree(8), MaxTree(8)
+        values = np.array([3.0, 1.0, 4.0, 1.5, 9.0])
+        min_tree.update(np.arange(5), values)
+        max_tree.update(np.arange(5), values)
+        self.assertEqual(min_tree.min(), 1.0)
+        self.assertEqual(max_tree.max(), 9.0)
+        max_tree.update([4], [2.0])
+        self.assertEqual(max_tree.max(), 4.0)
+
+    def test_sampling_follows_priorities(self):
+        for i in range(100):
+            self.memory.add((i, i, i, i, False))
+        self.memory.update_priorities(np.arange(100), np.where(np.arange(100) == 7, 1000.0, 0.0))
+        samples, indices, weights = self.memory.sample(32)
+        self.assertGreater(np.mean(indices == 7), 0.5)
+        self.assertTrue(np.all(weights <= 1.0 + 1e-9))
+        self.assertEqual(samples[0][0], indices[0])
+
+    def test_ring_overwrite(self):
+        memory = PrioritizedReplayBuffer(10)
+        memory.add_batch([(i, i, i, i, False) for i in range(15)])
+        self.assertEqual(len(memory), 10)
+        _, indices, _ = memory.sample(10)
+        self.assertTrue(np.all(indices < 10))
+
+    def test_empty_updates_and_samples(self):
+        memory = PrioritizedReplayBuffer(10, storage='columnar')
+        memory.add_batch([(np.zeros(2), 0, 0.0, np.zeros(2), False) for _ in range(4)])
+        memory.update_priorities([], [])
+        self.assertAlmostEqual(memory.sum_tree.total(), 4 * memory.max_priority ** memory.alpha)
+        samples, indices, weights = memory.sample(0)
+        self.assertEqual((len(samples), len(indices), len(weights)), (0, 0, 0))
+
+    def test_columnar_storage(self):
+        memory = PrioritizedReplayBuffer(100, storage='columnar')
+        for i in range(50):
+            memory.add((np.full(4, i, dtype=np.float32), i % 3, float(i), np.full(4, i + 1, dtype=np.float32), i == 49))
+        samples, indices, weights = memory.sample(16)
+        self.assertIsInstance(samples, ExperienceBatch)
+        self.assertEqual(len(samples), 16)
+        self.assertEqual(samples.states.shape, (16, 4))
+        np.testing.assert_array_equal(samples.states[:, 0], indices)
+        np.testing.assert_array_equal(samples.actions, indices % 3)
+        state, action, reward, next_state, done = samples[0]
+        self.assertEqual(reward, float(indices[0]))
+
+    def test_columnar_state_compression(self):
+        memory = PrioritizedReplayBuffer(100, storage='columnar', state_compression='uint8', state_range=(0.0, 1.0))
+        states = np.random.rand(100, 8).astype(np.float32)
+        memory.add_batch([(state, 0, 0.0, state, False) for state in states])
+        samples, indices, _ = memory.sample(10)
+        np.testing.assert_allclose(samples.states, states[indices], atol=1 / 255)
+        report = memory.memory_report()
+        self.assertEqual(report['experiences']['states'], 100 * 8)
+        self.assertGreater(report['total'], report['trees'])
+
+class TestLinearCFR(unittest.TestCase):
+    def setUp(self):
+        self.memory = fill_synthetic_memory(PrioritizedReplayBuffer(500, storage='columnar'), 500, 8, 4)
+
+    def test_compiled_step_matches_eager(self):
+        model = build_benchmark_q_network(8, 4)
+        eager = LinearCFR(model, self.memory, keras.optimizers.SGD(learning_rate=0.0))
+        compiled = LinearCFR(model, self.memory, keras.optimizers.SGD(learning_rate=0.0), compiled=True)
+        samples, _, weights = self.memory.sample(BATCH_SIZE)
+        batch = samples.columns() + (weights.astype(np.float32),)
+        eager_loss, eager_td = eager.train_step(*batch)
+        compiled_loss, compiled_td = compiled.train_step(*batch)
+        np.testing.assert_allclose(eager_td.numpy(), compiled_td.numpy(), rtol=1e-5, atol=1e-5)
+        self.assertAlmostEqual(float(eager_loss), float(compiled_loss), places=4)
+
+    def test_pipelined_training_updates_priorities(self):
+        cfr = LinearCFR(build_benchmark_q_network(8, 4), self.memory, keras.optimizers.Adam(), compiled=True)
+        before = self.memory.sum_tree.total()
+        loss = cfr.train(20)
+        self.assertTrue(np.isfinite(loss))
+        self.assertNotEqual(self.memory.sum_tree.total(), before)
+
+    def test_pipelined_training_raises_worker_errors(self):
+        empty = PrioritizedReplayBuffer(10, storage='columnar')
+        cfr = LinearCFR(build_benchmark_q_network(8, 4), empty, keras.optimizers.Adam(), compiled=True)
+        with self.assertRaises(Exception):
+            cfr.train(5)
+
+        class FailingMemory:
+            def update_priorities(self, indices, td_errors):
+                raise ValueError("update failed")
+
+        updater = PriorityUpdater(FailingMemory()).start()
+        updater.put(np.arange(2), np.zeros(2))
+        with self.assertRaises(ValueError):
+            updater.stop()
+
+class TestGameTreeTraversal(unittest.TestCase):
+    def setUp(self):
+        self.model = build_benchmark_q_network(8, 4)
+        self.memory = PrioritizedReplayBuffer(1000, storage='columnar')
+
+    def test_vectorized_traversal(self):
+        calls = []
+        def model(states, training=False):
+            calls.append(len(states))
+            return self.model(states, training=training)
+
+        traversal = GameTreeTraversal(model, self.memory, None)
+        envs = [SyntheticEnv(8, 4, episode_length=5, seed=i) for i in range(4)]
+        stats = traversal.traverse_vectorized(envs, 10)
+        self.assertEqual(stats['episodes'], 10)
+        self.assertEqual(stats['transitions'], 50)
+        self.assertEqual(len(self.memory), 50)
+        self.assertEqual(calls[0], 4)
+        self.assertLess(len(calls), 50)
+        self.assertGreater(stats['transitions_per_sec'], 0)
+
+    def test_external_sampling_matches_recursion(self):
+        env = SyntheticEnv(8, 1, seed=0)
+        state = env.reset()
+        traversal = GameTreeTraversal(self.model, self.memory, env)
+        rewards = []
+        for _ in range(3):
+            state, reward, _, _ = env.simulate(state, 0)
+            rewards.append(reward)
+        expected = np.asarray(self.model(state[np.newaxis]))[0]
+        for reward in reversed(rewards):
+            expected = reward + GAMMA * expected
+        np.testing.assert_allclose(traversal.external_sampling(env.state, 3), expected, rtol=1e-5)
+
+    def test_external_sampling_cache_and_depth(self):
+        calls = []
+        def model(states, training=False):
+            calls.append(len(states))
+            return self.model(states, training=training)
+
+        env = SyntheticEnv(8, 4, seed=0)
+        sampler = ExternalSampler(model, env, cache_size=10, num_samples=8)
+        roots = np.stack([env.reset() for _ in range(4)])
+        values = sampler.evaluate(roots, 2000)
+        self.assertEqual(values.shape, (4, 4))
+        self.assertEqual(len(calls), 1)
+        sampler.evaluate(roots, 0)
+        sampler.evaluate(roots, 0)
+        self.assertEqual(sampler.cache.stats()['hits'], 4)
+        self.assertLessEqual(sampler.cache.stats()['size'], 10)
+
+class TestActorLearner(unittest.TestCase):
+    def test_actors_feed_learner(self):
+        memory = PrioritizedReplayBuffer(10000, storage='columnar')
+        cfr = LinearCFR(build_benchmark_q_network(8, 4), memory, keras.optimizers.Adam(), compiled=True)
+        learner = ActorLearner(cfr, functools.partial(build_benchmark_q_network, 8, 4),
+                               functools.partial(SyntheticEnv, 8, 4, 5), num_actors=2, envs_per_actor=2,
+                               chunk_traversals=4, broadcast_interval=20)
+        with learner:
+            metrics = learner.run(40)
+            self.assertEqual(metrics['actors_alive'], 2)
+        self.assertGreaterEqual(metrics['train_steps'], 40)
+        self.assertGreater(metrics['transitions'], 0)
+        self.assertGreaterEqual(len(memory), min(metrics['transitions'], 10000))
+        self.assertGreaterEqual(metrics['weight_version'], 1)
+        self.assertFalse(any(actor.is_alive() for actor in learner.actors))
+
+class TestInferenceEngine(unittest.TestCase):
+    def setUp(self):
+        self.model = build_benchmark_q_network(8, 4)
+        self.engine = InferenceEngine(self.model, max_batch_size=16, max_latency_ms=20).start()
+
+    def tearDown(self):
+        self.engine.stop()
+
+    def test_micro_batched_results_match_model(self):
+        states = np.random.rand(40, 8).astype(np.float32)
+        futures = [self.engine.submit(state) for state in states]
+        results = np.stack([future.result(timeout=10) for future in futures])
+        np.testing.assert_allclose(results, np.asarray(self.model(states)), rtol=1e-5, atol=1e-5)
+        stats = self.engine.stats()
+        self.assertEqual(stats['requests'], 40)
+        self.assertGreater(stats['mean_batch_size'], 1)
+        self.assertGreaterEqual(stats['p99_ms'], stats['p50_ms'])
+
+    def test_worker_start_loads_weights_and_reports_ready(self):
+        weights_path = os.path.join(tempfile.mkdtemp(), "model.weights.h5")
+        self.model.save_weights(weights_path)
+        client = app.test_client()
+        with patch.dict(globals(), {'build_model': lambda: build_benchmark_q_network(8, 4), 'inference_engine': None}):
+            self.assertEqual(client.get('/ready').status_code, 503)
+            engine = start_inference(weights_path)
+            try:
+                self.assertEqual(client.get('/ready').get_json(), {"ready": True})
+                state = np.random.rand(8).astype(np.float32)
+                np.testing.assert_allclose(engine.predict(state, timeout=10), np.asarray(self.model(state[None]))[0], rtol=1e-5, atol=1e-5)
+            finally:
+                engine.stop()
+
+class TestRealTimeDataIntegrator(unittest.TestCase):
+    class Source:
+        def __init__(self, data, delay=0.0):
+            self.data = data
+            self.delay = delay
+
+        def get_data(self):
+            time.sleep(self.delay)
+            return dict(self.data)
+
+    def test_concurrent_polling_with_timeouts(self):
+        integrator = RealTimeDataIntegrator()
+        integrator.add_data_source(self.Source({'weather': 'sun'}), name='weather')
+        integrator.add_data_source(self.Source({'flights': 3}, delay=1.0), name='flights', timeout=0.1)
+        start = time.perf_counter()
+        snapshot = integrator.update_data()
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(dict(snapshot.data), {'weather': 'sun'})
+        metrics = integrator.metrics()
+        self.assertEqual(metrics['sources']['flights']['timeouts'], 1)
+        self.assertIsNotNone(metrics['sources']['weather']['last_success'])
+        integrator.stop()
+
+    def test_hung_source_holds_one_worker(self):
+        class HungSource:
+            def __init__(self):
+                self.release = threading.Event()
+                self.calls = 0
+
+            def get_data(self):
+                self.calls += 1
+                self.release.wait()
+                return {'flights': 3}
+
+        hung = HungSource()
+        integrator = RealTimeDataIntegrator()
+        integrator.add_data_source(hung, name='flights', interval=0.01, timeout=0.01)
+        integrator.add_data_source(self.Source({'weather': 'sun'}), name='weather', interval=0.05, timeout=0.5)
+        integrator.start()
+        try:
+            time.sleep(1.0)
+            stats = integrator.metrics()['sources']
+            self.assertEqual(hung.calls, 1)
+            self.assertGreater(stats['flights']['skipped'], 10)
+            self.assertEqual(stats['weather']['timeouts'], 0)
+            self.assertGreater(stats['weather']['polls'], 5)
+            # Once the hung fetch returns, the source is fetched again
+            hung.release.set()
+            deadline = time.monotonic() + 5
+            while hung.calls < 2 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertGreaterEqual(hung.calls, 2)
+        finally:
+            hung.release.set()
+            integrator.stop()
+
+    def test_versioned_deltas_snapshots_and_subscribers(self):
+        integrator = RealTimeDataIntegrator().start()
+        self.addCleanup(integrator.stop)
+        received = queue.Queue()
+        integrator.subscribe(lambda changes, snapshot: received.put(changes), keys={'price'})
+
+        integrator.push({'price': 100, 'seats': 5}, version=2)
+        before = integrator.get_real_time_data()
+        self.assertEqual(integrator.push({'price': 90}, version=1).version, 1)  # stale, ignored
+        integrator.push({'price': 100, 'seats': 4}, version=3)  # only seats changed
+        self.assertEqual(dict(before), {'price': 100, 'seats': 5})
+        self.assertEqual(dict(integrator.get_real_time_data()), {'price': 100, 'seats': 4})
+        self.assertEqual(integrator.get_snapshot().key_versions['price'], 3)
+        with self.assertRaises(TypeError):
+            before['price'] = 1
+        self.assertEqual(received.get(timeout=5), {'price': 100})
+        self.assertTrue(received.empty())
+        self.assertEqual(integrator.metrics()['version'], 2)
+
+    def test_unchanged_newer_value_still_advances_the_key_version(self):
+        integrator = RealTimeDataIntegrator()
+        integrator.push({'price': 'A'}, version=1)
+        snapshot = integrator.push({'price': 'A'}, version=3)
+        self.assertEqual((snapshot.version, snapshot.key_versions['price']), (1, 3))
+        self.assertEqual(len(integrator.lags), 1)
+        self.assertIs(integrator.push({'price': 'B'}, version=2), snapshot)
+        self.assertEqual(dict(integrator.get_real_time_data()), {'price': 'A'})
+
+class TestDataPreparation(unittest.TestCase):
+    def setUp(self):
+        self.state_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.state_dir)
+        self.destinations = ["paris france", "rome italy", "paris texas", "tokyo japan"] * 20
+        self.preferences = np.random.randint(0, NUM_PREFERENCES, (80, 3))
+        self.labels = np.random.rand(80).astype(np.float32)
+
+    def test_dataset_matches_serving_transform(self):
+        prep = DataPreparation(self.state_dir)
+        dataset = prep.prepare_dataset(self.destinations, self.preferences, self.labels)
+        features, labels = next(iter(dataset))
+        self.assertEqual(features.shape, (BATCH_SIZE, SEQUENCE_LENGTH + NUM_PREFERENCES))
+        served = prep.transform_batch(self.destinations[:BATCH_SIZE], self.preferences[:BATCH_SIZE])
+        np.testing.assert_allclose(served, features, rtol=1e-5, atol=1e-5)
+        self.assertEqual(prep.embedding_cache.stats()['misses'], 4)
+        prep.transform_batch(self.destinations[:8], self.preferences[:8])
+        self.assertEqual(prep.embedding_cache.stats()['misses'], 4)
+        shard = prep.prepare_dataset(self.destinations, self.preferences, self.labels, num_shards=4, shard_index=1)
+        self.assertEqual(sum(len(y) for _, y in shard), 20)
+
+    def test_state_is_adapted_once_and_persisted(self):
+        prep = DataPreparation(self.state_dir)
+        prep.adapt(self.destinations, self.preferences)
+        expected = prep.transform_batch(self.destinations[:4], self.preferences[:4])
+        prep.save()
+        restored = DataPreparation(self.state_dir)
+        self.assertTrue(restored.adapted)
+        self.assertEqual(len(restored.embedding_cache), 4)
+        np.testing.assert_allclose(restored.transform_batch(self.destinations[:4], self.preferences[:4]), expected, rtol=1e-5)
+        self.assertEqual(restored.embedding_cache.stats()['misses'], 0)
+
+class TestEvaluator(unittest.TestCase):
+    def setUp(self):
+        self.env_fn = lambda seed: SyntheticEnv(8, 4, episode_length=10, seed=seed)
+        self.model = build_benchmark_q_network(8, 4)
+        self.baseline = build_benchmark_q_network(8, 4)
+
+    def test_vectorized_matches_one_env_at_a_time(self):
+        vectorized = Evaluator(self.env_fn, num_envs=16).calculate_exploitability(self.model, num_episodes=20)
+        sequential = Evaluator(self.env_fn, num_envs=1).calculate_exploitability(self.model, num_episodes=20)
+        self.assertAlmostEqual(vectorized, sequential, places=4)
+
+    def test_paired_comparison_stops_early(self):
+        evaluator = Evaluator(self.env_fn, num_envs=16)
+        # Common seeds make a model's difference with itself exactly zero
+        self.assertEqual(evaluator.compare_to_baseline(self.model, self.model, num_episodes=1000), 0.0)
+        self.assertEqual(evaluator.last_report['episodes'], 16)
+        self.assertTrue(evaluator.last_report['stopped_early'])
+
+        evaluator.compare_to_baseline(self.model, self.baseline, num_episodes=64, tolerance=0.0)
+        report = evaluator.last_report
+        self.assertEqual(report['episodes'], 64)
+        self.assertFalse(report['stopped_early'])
+        self.assertAlmostEqual(report['difference'], report['model_reward'] - report['baseline_reward'], places=6)
+        self.assertGreater(report['episodes_per_sec'], 0)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
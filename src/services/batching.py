@@ -0,0 +1,192 @@
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+import numpy as np
+
+# Constants
+MAX_BATCH_SIZE = 64
+MAX_LATENCY_MS = 5.0
+LATENCY_HISTORY = 10000  # most recent requests kept for the latency percentiles
+
+# Thread-safe LRU map with hit/miss counters shared by the prediction,
+# embedding and transposition caches. With a ttl, entries also expire after
+# ttl seconds; expired entries count as misses.
+class LRUCache:
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _lookup(self, key, now):
+        value = self.entries.get(key)
+        if value is None or (self.ttl is not None and self.expires[key] < now):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self._lookup(key, time.monotonic())
+        return default if value is None else value
+
+    # One value per key, None where missing
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self.lock:
+            return [self._lookup(key, now) for key in keys]
+
+    def put(self, key, value):
+        self.put_many([key], [value])
+
+    def put_many(self, keys, values):
+        expires = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            for key, value in zip(keys, values):
+                self.entries[key] = value
+                self.entries.move_to_end(key)
+                if expires is not None:
+                    self.expires[key] = expires
+            while len(self.entries) > self.maxsize:
+                key, _ = self.entries.popitem(last=False)
+                self.expires.pop(key, None)
+
+    def items(self):
+        with self.lock:
+            return list(self.entries.items())
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.expires.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {'size': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+# Collects concurrent submit() calls into one batch, closed after
+# max_batch_size items or max_latency_ms from the first arrival, and
+# answers them all from a single process_fn(items) call that returns one
+# result per item. Used by both services' request paths.
+class MicroBatcher:
+    def __init__(self, process_fn, max_batch_size=MAX_BATCH_SIZE, max_latency_ms=MAX_LATENCY_MS, history=LATENCY_HISTORY):
+        self.process_fn = process_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency_ms / 1000.0
+        self.queue = queue.Queue()
+        self.latencies = deque(maxlen=history)
+        self.batches = 0
+        self.requests = 0
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((time.perf_counter(), item, future))
+        return future
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            try:
+                first = self.queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            batch = [first]
+            deadline = first[0] + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    batch.append(self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        try:
+            results = self.process_fn([item for _, item, _ in batch])
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        done = time.perf_counter()
+        for (enqueued, _, future), result in zip(batch, results):
+            future.set_result(result)
+            self.latencies.append(done - enqueued)
+        self.batches += 1
+        self.requests += len(batch)
+
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000 if self.latencies else np.zeros(1)
+        return {
+            'queue_depth': self.queue.qsize(),
+            'requests': self.requests,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+        }
+
+import unittest
+
+class TestLRUCache(unittest.TestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(2)
+        cache.put_many(["a", "b"], [1, 2])
+        self.assertEqual(cache.get("a"), 1)
+        cache.put("c", 3)
+        self.assertEqual(cache.get_many(["a", "b", "c"]), [1, None, 3])
+        self.assertEqual(cache.stats(), {'size': 2, 'hits': 3, 'misses': 1, 'hit_rate': 0.75})
+
+    def test_entries_expire_after_ttl(self):
+        cache = LRUCache(10, ttl=0.05)
+        cache.put("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        time.sleep(0.1)
+        self.assertEqual(cache.get("a", "missing"), "missing")
+
+class TestMicroBatcher(unittest.TestCase):
+    def test_concurrent_submits_share_batches(self):
+        calls = []
+        def process(items):
+            calls.append(len(items))
+            return [item * 2 for item in items]
+        batcher = MicroBatcher(process, max_batch_size=8, max_latency_ms=20).start()
+        try:
+            futures = [batcher.submit(i) for i in range(20)]
+            self.assertEqual([future.result(timeout=5) for future in futures], [i * 2 for i in range(20)])
+        finally:
+            batcher.stop()
+        self.assertLessEqual(max(calls), 8)
+        self.assertEqual(batcher.stats()['requests'], 20)
+        self.assertGreater(batcher.stats()['mean_batch_size'], 1)
+
+    def test_errors_reach_every_future_in_the_batch(self):
+        def process(items):
+            raise ValueError("boom")
+        batcher = MicroBatcher(process, max_latency_ms=20).start()
+        try:
+            futures = [batcher.submit(i) for i in range(3)]
+            for future in futures:
+                self.assertRaises(ValueError, future.result, 5)
+        finally:
+            batcher.stop()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,225 @@
+import argparse
+import datetime
+import importlib.util
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import numpy as np
+# Imported up front so the first suite is seeded too; every service uses it
+import tensorflow as tf
+
+# Constants
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_PATH = "benchmark-results.json"
+BASELINE_PATH = "benchmark-baseline.json"
+REGRESSION_THRESHOLD = 0.10  # relative change that counts as a regression
+SEED = 1234
+
+# The service files have hyphenated names, so they are loaded by path
+def load_service(filename):
+    name = os.path.splitext(filename)[0]
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(SERVICES_DIR, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+def ai():
+    return load_service("ai-itinerary.py")
+
+def data():
+    return load_service("data-collect.py")
+
+# Each suite returns a flat {metric: value} dict. Metric names carry their
+# unit, which decides the direction of a regression (see direction()).
+def suite_replay(quick):
+    sizes = (10000, 100000) if quick else (10000, 100000, 1000000)
+    added = ai().benchmark_replay_add(sizes)
+    sampled = ai().benchmark_replay_sampling(sizes, num_samples=200 if quick else 1000)
+    return {
+        **{f"replay.add_per_sec.size_{size}": value for size, value in added.items()},
+        **{f"replay.sample_update_us.size_{size}": value for size, value in sampled.items()},
+    }
+
+def suite_train(quick):
+    results = ai().benchmark_train_steps(num_steps=100 if quick else 500, memory_size=10000 if quick else 100000)
+    return {f"train.steps_per_sec.{mode}": value for mode, value in results.items()}
+
+def suite_traversal(quick):
+    results = ai().benchmark_traversal(num_envs=(1, 32) if quick else (1, 8, 32, 128), num_traversals=64 if quick else 256)
+    return {f"traversal.transitions_per_sec.envs_{envs}": value for envs, value in results.items()}
+
+def suite_scrape(quick):
+    results = data().benchmark_scraping(num_pages=20 if quick else 100, latency=0.02 if quick else 0.05)
+    return {f"scrape.pages_per_sec.{mode}": value for mode, value in results.items()}
+
+def suite_processing(quick):
+    results = data().benchmark_processing(num_rows=20000 if quick else 200000)
+    return {f"processing.rows_per_sec.{mode}": value for mode, value in results.items()}
+
+def suite_api(quick):
+    results = data().benchmark_api(num_requests=300 if quick else 2000, concurrency=8 if quick else 16)
+    return {f"api.{name}": value for name, value in results.items()}
+
+def suite_inference(quick):
+    results = ai().benchmark_inference(num_clients=(1, 16) if quick else (1, 16, 64), requests_per_client=50 if quick else 200)
+    return {
+        f"inference.{mode}.clients_{clients}.{name}": value
+        for (clients, mode), stats in results.items()
+        for name, value in stats.items()
+    }
+
+SUITES = {
+    'replay': suite_replay,
+    'train': suite_train,
+    'traversal': suite_traversal,
+    'scrape': suite_scrape,
+    'processing': suite_processing,
+    'api': suite_api,
+    'inference': suite_inference,
+}
+
+# +1 when higher is better, -1 when lower is better, 0 when informational
+def direction(metric):
+    if "per_sec" in metric or "hit_rate" in metric:
+        return 1
+    if any(part.endswith(("_ms", "_us", "_sec", "_seconds")) for part in metric.split(".")):
+        return -1
+    return 0
+
+def seed_everything(seed=SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+    tf.random.set_seed(seed)
+
+def metadata(suites, quick, repeat):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=SERVICES_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'suites': suites,
+        'quick': quick,
+        'repeat': repeat,
+    }
+
+# Each metric is the median over `repeat` runs, which keeps one noisy run
+# from tripping the regression check
+def run(suites, quick=False, repeat=1):
+    samples = {}
+    for suite in suites:
+        for attempt in range(repeat):
+            print(f"== {suite} ({attempt + 1}/{repeat})")
+            seed_everything()
+            for name, value in SUITES[suite](quick).items():
+                samples.setdefault(name, []).append(float(value))
+    metrics = {name: float(np.median(values)) for name, values in samples.items()}
+    return {'metadata': metadata(suites, quick, repeat), 'metrics': metrics}
+
+# Returns one row per metric present in both runs, with its relative change
+# and whether that change is a regression beyond the threshold
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    rows = []
+    for metric, value in sorted(results['metrics'].items()):
+        if metric not in baseline['metrics']:
+            continue
+        old = baseline['metrics'][metric]
+        change = (value - old) / abs(old) if old else 0.0
+        sign = direction(metric)
+        rows.append({
+            'metric': metric,
+            'baseline': old,
+            'current': value,
+            'change': change,
+            'regression': sign != 0 and -sign * change > threshold,
+        })
+    return rows
+
+def print_comparison(rows, threshold):
+    width = max((len(row['metric']) for row in rows), default=10)
+    for row in rows:
+        flag = "REGRESSION" if row['regression'] else ""
+        print(f"{row['metric']:<{width}} {row['baseline']:>12.2f} -> {row['current']:>12.2f} {row['change']:>+8.1%} {flag}")
+    regressions = sum(row['regression'] for row in rows)
+    print(f"{regressions} regression(s) beyond {threshold:.0%} across {len(rows)} compared metrics")
+    return regressions
+
+def write_json(path, payload):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Python services against a saved baseline")
+    parser.add_argument("--suite", action="append", choices=sorted(SUITES), help="suite to run (repeatable, default: all)")
+    parser.add_argument("--quick", action="store_true", help="smaller workloads for a fast smoke run")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="also store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per suite; metrics are the median")
+    args = parser.parse_args(argv)
+
+    results = run(args.suite or list(SUITES), args.quick, args.repeat)
+    write_json(args.output, results)
+    print(f"Results written to {args.output}")
+
+    regressions = 0
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['metadata'].get('quick') != args.quick:
+            print("Warning: baseline and current run use different workload sizes")
+        regressions = print_comparison(compare(results, baseline, args.threshold), args.threshold)
+    if args.save_baseline:
+        write_json(args.baseline, results)
+        print(f"Baseline saved to {args.baseline}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
+
+import unittest
+
+class TestBenchmarkHarness(unittest.TestCase):
+    def test_direction_from_metric_units(self):
+        self.assertEqual(direction("replay.add_per_sec.size_10000"), 1)
+        self.assertEqual(direction("replay.sample_update_us.size_10000"), -1)
+        self.assertEqual(direction("api.single_p99_ms"), -1)
+        self.assertEqual(direction("api.cache_hit_rate"), 1)
+        self.assertEqual(direction("inference.micro_batched.clients_16.p50_ms"), -1)
+        self.assertEqual(direction("api.mean_coalesced_batch"), 0)
+
+    def test_compare_flags_regressions_in_either_direction(self):
+        baseline = {'metrics': {'train.steps_per_sec.eager': 100.0, 'api.single_p50_ms': 10.0, 'api.mean_coalesced_batch': 5.0}}
+        results = {'metrics': {'train.steps_per_sec.eager': 85.0, 'api.single_p50_ms': 10.5, 'api.mean_coalesced_batch': 1.0,
+                               'scrape.pages_per_sec.concurrent': 50.0}}
+        rows = {row['metric']: row for row in compare(results, baseline, threshold=0.1)}
+        self.assertEqual(set(rows), {'train.steps_per_sec.eager', 'api.single_p50_ms', 'api.mean_coalesced_batch'})
+        self.assertTrue(rows['train.steps_per_sec.eager']['regression'])
+        self.assertFalse(rows['api.single_p50_ms']['regression'])
+        self.assertFalse(rows['api.mean_coalesced_batch']['regression'])
+        rows = compare({'metrics': {'api.single_p50_ms': 12.0}}, baseline, threshold=0.1)
+        self.assertTrue(rows[0]['regression'])
+
+    def test_runs_are_seeded_before_the_first_suite(self):
+        seed_everything()
+        first = (random.random(), np.random.rand(), float(tf.random.uniform(())))
+        seed_everything()
+        self.assertEqual((random.random(), np.random.rand(), float(tf.random.uniform(()))), first)
+
+    def test_services_load_by_path(self):
+        self.assertTrue(hasattr(data(), 'benchmark_processing'))
+        results = suite_processing(quick=True)
+        self.assertEqual(set(results), {'processing.rows_per_sec.stream', 'processing.rows_per_sec.batch'})
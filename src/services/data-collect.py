@@ -1,10 +1,33 @@
 import requests
+from requests.adapters import HTTPAdapter
 import time
+import random
 import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+from urllib.parse import urlsplit
+import os
+import json
+import hashlib
+import pickle
+import math
+import itertools
+import operator
+import shutil
+import zipfile
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from bs4 import BeautifulSoup
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+import subprocess
+import sys
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne, ASCENDING
+from pymongo.errors import DuplicateKeyError
 from flask import Flask, request, jsonify
 import pandas as pd
 import numpy as np
@@ -12,116 +35,918 @@ from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.metrics import mean_squared_error
 from sklearn.preprocessing import StandardScaler
-from tensorflow.keras.models import Sequential
+import joblib
+import tensorflow as tf
+from tensorflow.keras.models import Sequential, load_model
 from tensorflow.keras.layers import Dense, LSTM
+from tensorflow.keras.callbacks import EarlyStopping
 import jwt
 from functools import wraps
+import instrumentation
+import serving
+import batching
 
 # Constants
 MONGO_URI = "mongodb://localhost:27017"
 DB_NAME = "travel_data"
 SCRAPE_INTERVAL = 3600  # 1 hour
 SECRET_KEY = "your_secret_key_here"
+MAX_RETRIES = 5
+BACKOFF_BASE = 1.0  # seconds, doubled per retry
+BACKOFF_CAP = 60.0
+SCRAPE_WORKERS = 16
+SOURCE_CONCURRENCY = 4  # in-flight requests per source
+PROXY_COOLDOWN = 30.0  # seconds a tripped proxy waits before a probe/trial
+PROXY_PROBE_INTERVAL = 10.0
+PROXY_PROBE_URL = "http://www.example.com/"
+CACHE_DIR = "scrape_cache"
+CACHE_MAX_BYTES = 512 * 1024 * 1024
+CACHE_FLUSH_EVERY = 200  # index updates between writes of index.json
+HTML_PARSER = 'lxml' if etree is not None else 'html.parser'
+SOURCES = ["Expedia", "Booking", "Airbnb"]
+NUMERIC_COLUMNS = ['price', 'rating', 'amenities_count']
+PROCESSOR_STATE_PATH = "processor_state.pkl"
+CHUNK_SIZE = 10000  # rows per streaming chunk
+BLOOM_CAPACITY = 1000000  # expected distinct hotels per cycle
+TRAIN_SAMPLE_ROWS = 200000  # rows per cycle kept for retraining
+WRITE_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 10000
+PRICE_HISTORY_DIR = "price_history"
+HISTORY_WINDOW = 14  # observations per LSTM input sequence
+HISTORY_FREQ = 86400  # roll observations up to daily prices before windowing
+HISTORY_TRAIN_PERIODS = 180  # most recent HISTORY_FREQ periods the forecaster trains on
+HISTORY_CACHED_PARTITIONS = 32  # price history partitions kept in memory
+DRIFT_THRESHOLD = 0.1  # max standardized mean shift that still skips a retrain
+TREES_PER_UPDATE = 10  # trees/boosting stages added per incremental retrain
+MAX_ESTIMATORS = 300  # cap on trees/boosting stages grown by incremental retrains
+LSTM_UPDATE_EPOCHS = 5
+LSTM_WEIGHTS_PATH = "lstm.weights.h5"
+TRAIN_CORES = os.cpu_count() or 1
+MODEL_DIR = "models"
+KEEP_VERSIONS = 5  # versions kept on disk for rollback
+KEEP_LOADED_VERSIONS = 2  # versions kept in memory for instant rollback
+PREDICTION_CACHE_SIZE = 100000
+PREDICTION_CACHE_TTL = 300.0  # seconds
+COALESCE_MAX_BATCH = 64
+COALESCE_MAX_LATENCY_MS = 2.0
+MAX_PREDICT_BATCH = 10000  # hotels per /predict/batch call
+MODEL_POLL_INTERVAL = 5.0  # seconds between registry checks in serving workers
+SERVE_BIND = "0.0.0.0:5000"
+
+class ProxyHealth:
+    # Latency/error EWMAs and circuit breaker state for one proxy. The
+    # breaker opens after `failure_threshold` consecutive failures, and the
+    # proxy gets no traffic until a probe or trial request succeeds.
+    def __init__(self, url):
+        self.url = url
+        self.latency = 0.0  # optimistic, so untried proxies get picked early
+        self.error_rate = 0.0
+        self.consecutive_failures = 0
+        self.requests = 0
+        self.failures = 0
+        self.state = 'closed'
+        self.opened_at = 0.0
+
+    def score(self):
+        return (1.0 - self.error_rate) ** 2 / (self.latency + 0.01)
+
+    def as_dict(self):
+        return {
+            'state': self.state,
+            'latency_ms': self.latency * 1000,
+            'error_rate': self.error_rate,
+            'consecutive_failures': self.consecutive_failures,
+            'requests': self.requests,
+            'failures': self.failures,
+            'score': self.score(),
+        }
+
+# Raised when every proxy's breaker is open. It is a RequestException, so
+# BaseScraper.get backs off and retries as for any failed request.
+class NoProxyAvailable(requests.RequestException):
+    pass
 
 class ProxyManager:
-    def __init__(self):
-        self.proxies = [
+    def __init__(self, proxies=None, failure_threshold=3, cooldown=PROXY_COOLDOWN, probe_url=None,
+                 probe_interval=PROXY_PROBE_INTERVAL, smoothing=0.2, allow_direct=False):
+        self.proxies = proxies if proxies is not None else [
             "http://proxy1.example.com",
             "http://proxy2.example.com",
             # Add more proxies
         ]
-        self.current_index = 0
+        self.health = {proxy: ProxyHealth(proxy) for proxy in self.proxies}
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_url = probe_url
+        self.probe_interval = probe_interval
+        self.smoothing = smoothing
+        self.allow_direct = allow_direct
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
 
+    # Weighted-random pick over proxies whose breaker is closed; an open
+    # proxy past its cooldown is let through for a single half-open trial.
+    # With every breaker open this raises NoProxyAvailable, or with
+    # allow_direct returns None so the request goes out without a proxy.
     def get_proxy(self):
-        proxy = self.proxies[self.current_index]
-        self.current_index = (self.current_index + 1) % len(self.proxies)
-        return {"http": proxy, "https": proxy}
+        if not self.proxies:
+            return None
+        now = time.monotonic()
+        with self.lock:
+            candidates = [h for h in self.health.values() if h.state == 'closed']
+            if not candidates:
+                expired = [h for h in self.health.values()
+                           if h.state == 'open' and now - h.opened_at >= self.cooldown]
+                if not expired:
+                    if self.allow_direct:
+                        return None
+                    raise NoProxyAvailable("Every proxy circuit breaker is open")
+                health = min(expired, key=lambda h: h.opened_at)
+                health.state = 'half_open'
+            else:
+                health = random.choices(candidates, weights=[h.score() for h in candidates])[0]
+        return {"http": health.url, "https": health.url}
+
+    def record(self, proxies, latency, ok):
+        if not proxies:
+            return
+        with self.lock:
+            health = self.health[proxies["http"]]
+            health.requests += 1
+            health.latency += self.smoothing * (latency - health.latency)
+            health.error_rate += self.smoothing * ((0.0 if ok else 1.0) - health.error_rate)
+            if ok:
+                health.consecutive_failures = 0
+                health.state = 'closed'
+            else:
+                health.failures += 1
+                health.consecutive_failures += 1
+                if health.state == 'half_open' or health.consecutive_failures >= self.failure_threshold:
+                    health.state = 'open'
+                    health.opened_at = time.monotonic()
+
+    def probe(self):
+        now = time.monotonic()
+        with self.lock:
+            due = [h for h in self.health.values() if h.state == 'open' and now - h.opened_at >= self.cooldown]
+            for health in due:
+                health.state = 'half_open'
+        for health in due:
+            proxies = {"http": health.url, "https": health.url}
+            start = time.perf_counter()
+            try:
+                requests.get(self.probe_url, proxies=proxies, timeout=5).raise_for_status()
+                ok = True
+            except requests.RequestException:
+                ok = False
+            self.record(proxies, time.perf_counter() - start, ok)
+
+    def _probe_loop(self):
+        while not self.stop_event.wait(self.probe_interval):
+            self.probe()
+
+    def start_probing(self):
+        if self.probe_url:
+            threading.Thread(target=self._probe_loop, daemon=True).start()
+        return self
+
+    def stop_probing(self):
+        self.stop_event.set()
+
+    def stats(self):
+        with self.lock:
+            return {proxy: health.as_dict() for proxy, health in self.health.items()}
+
+class HTTPCache:
+    # On-disk response cache. Bodies live in one file per URL, and a JSON
+    # index tracks ETag/Last-Modified validators, a content hash, size and
+    # last access. Least recently used bodies are evicted past max_bytes.
+    # The index is written every `flush_every` updates and on flush(), which
+    # scrapers call once per cycle.
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, flush_every=CACHE_FLUSH_EVERY):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.flush_every = flush_every
+        self.pending = 0
+        self.index_path = os.path.join(directory, "index.json")
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bytes_saved = 0
+        os.makedirs(directory, exist_ok=True)
+        try:
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+        self.total_bytes = sum(entry["size"] for entry in self.index.values())
+
+    def _body_path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode()).hexdigest() + ".html")
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f)
+        os.replace(tmp_path, self.index_path)
+        self.pending = 0
+
+    def _mark_dirty(self):
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self._save_index()
+
+    def flush(self):
+        with self.lock:
+            if self.pending:
+                self._save_index()
+
+    def conditional_headers(self, url):
+        with self.lock:
+            entry = self.index.get(url)
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    # Returns (body, changed); changed is False for 304s and for 200s whose
+    # body hashes the same as the cached copy
+    def update(self, url, response):
+        with self.lock:
+            entry = self.index.get(url)
+            if response.status_code == 304 and entry:
+                with open(self._body_path(url), encoding="utf-8") as f:
+                    body = f.read()
+                self.hits += 1
+                self.not_modified += 1
+                self.bytes_saved += entry["size"]
+                entry["accessed"] = time.time()
+                self._mark_dirty()
+                return body, False
+
+            body = response.text
+            content_hash = hashlib.sha256(body.encode("utf-8")).hexdigest()
+            changed = not entry or entry["hash"] != content_hash
+            if changed:
+                self.misses += 1
+                with open(self._body_path(url), "w", encoding="utf-8") as f:
+                    f.write(body)
+            else:
+                self.hits += 1
+            size = len(body.encode("utf-8"))
+            self.total_bytes += size - (entry["size"] if entry else 0)
+            self.index[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "hash": content_hash,
+                "size": size,
+                "accessed": time.time(),
+            }
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+            self._mark_dirty()
+            return body, changed
+
+    def _evict(self):
+        for url, entry in sorted(self.index.items(), key=lambda item: item[1]["accessed"]):
+            if self.total_bytes <= self.max_bytes:
+                break
+            self.total_bytes -= entry["size"]
+            del self.index[url]
+            try:
+                os.remove(self._body_path(url))
+            except OSError:
+                pass
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self.index),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'bytes_saved': self.bytes_saved,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+class CardSelectors:
+    # Declarative description of a listing card, shared by every scraper.
+    # Each selector is a (tag, css class) pair; `fields` map to the stripped
+    # text of the first match inside the card and `lists` to all matches.
+    def __init__(self, card, fields, lists=None, source=None):
+        self.card = card
+        self.fields = fields
+        self.lists = lists or {}
+        self.source = source
+
+    @staticmethod
+    def xpath(selector, prefix=".//"):
+        tag, css_class = selector
+        return f"{prefix}{tag}[contains(concat(' ', normalize-space(@class), ' '), ' {css_class} ')]"
+
+class HTMLExtractor:
+    # Turns listing pages into records. The lxml backend streams the page
+    # through a pull parser, evaluates precompiled XPaths on each finished
+    # card and then drops it, so the full document tree is never kept.
+    # The html.parser backend is the BeautifulSoup fallback.
+    def __init__(self, selectors, backend=HTML_PARSER, chunk_size=64 * 1024):
+        if backend == 'lxml' and etree is None:
+            raise ImportError("lxml is required for the lxml extraction backend")
+        self.selectors = selectors
+        self.backend = backend
+        self.chunk_size = chunk_size
+        if backend == 'lxml':
+            self.card_tag = selectors.card[0]
+            self.is_card = etree.XPath(f"boolean(self::{CardSelectors.xpath(selectors.card, '')})")
+            self.field_paths = {name: etree.XPath(f"string({CardSelectors.xpath(selector)})")
+                                for name, selector in selectors.fields.items()}
+            self.list_paths = {name: etree.XPath(CardSelectors.xpath(selector))
+                               for name, selector in selectors.lists.items()}
+
+    def extract(self, html):
+        if self.backend == 'lxml':
+            return list(self._iter_lxml(html))
+        return self._extract_soup(html)
+
+    def _record(self, fields, lists):
+        record = {**fields, **lists}
+        if self.selectors.source:
+            record["source"] = self.selectors.source
+        return record
+
+    def _iter_lxml(self, html):
+        parser = etree.HTMLPullParser(events=("end",), tag=self.card_tag)
+        for start in range(0, len(html), self.chunk_size):
+            parser.feed(html[start:start + self.chunk_size])
+            yield from self._drain(parser)
+        parser.close()
+        yield from self._drain(parser)
+
+    def _drain(self, parser):
+        for _, card in parser.read_events():
+            if not self.is_card(card):
+                continue
+            yield self._record(
+                {name: path(card).strip() for name, path in self.field_paths.items()},
+                {name: ["".join(item.itertext()).strip() for item in path(card)]
+                 for name, path in self.list_paths.items()},
+            )
+            # Free finished cards and everything before them
+            card.clear()
+            while card.getprevious() is not None:
+                del card.getparent()[0]
+
+    def _extract_soup(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        records = []
+        for card in soup.find_all(self.selectors.card[0], class_=self.selectors.card[1]):
+            records.append(self._record(
+                {name: card.find(tag, class_=css_class).text.strip()
+                 for name, (tag, css_class) in self.selectors.fields.items()},
+                {name: [item.text.strip() for item in card.find_all(tag, class_=css_class)]
+                 for name, (tag, css_class) in self.selectors.lists.items()},
+            ))
+        return records
 
 class BaseScraper:
-    def __init__(self):
-        self.session = requests.Session()
-        self.proxy_manager = ProxyManager()
+    start_urls = []
+    selectors = None
+
+    def __init__(self, start_urls=None, proxy_manager=None, max_retries=MAX_RETRIES, pool_size=SOURCE_CONCURRENCY, cache=None,
+                 parser=HTML_PARSER):
+        if start_urls is not None:
+            self.start_urls = start_urls
+        self.extractor = HTMLExtractor(self.selectors, parser) if self.selectors else None
+        self.proxy_manager = proxy_manager if proxy_manager is not None else ProxyManager()
+        self.cache = cache
+        self.max_retries = max_retries
+        self.pool_size = pool_size
+        self.sessions = {}
+        self.sessions_lock = threading.Lock()
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
 
-    def get(self, url):
-        while True:
+    # One keep-alive connection pool per host, shared by the worker threads
+    def session_for(self, url):
+        host = urlsplit(url).netloc
+        with self.sessions_lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[host] = session
+        return session
+
+    def get(self, url, headers=None):
+        headers = {**self.headers, **(headers or {})}
+        for attempt in range(self.max_retries + 1):
+            proxies = None
+            start = time.perf_counter()
             try:
-                response = self.session.get(url, headers=self.headers, proxies=self.proxy_manager.get_proxy(), timeout=10)
+                proxies = self.proxy_manager.get_proxy()
+                response = self.session_for(url).get(url, headers=headers, proxies=proxies, timeout=10)
                 response.raise_for_status()
+                self.proxy_manager.record(proxies, time.perf_counter() - start, ok=True)
+                instrumentation.observe('scrape_request_seconds', time.perf_counter() - start, "Scraper HTTP request latency",
+                                        scraper=type(self).__name__, outcome='ok')
                 return response
             except requests.RequestException as e:
-                print(f"Request failed: {e}")
-                time.sleep(5)
+                self.proxy_manager.record(proxies, time.perf_counter() - start, ok=False)
+                instrumentation.observe('scrape_request_seconds', time.perf_counter() - start, "Scraper HTTP request latency",
+                                        scraper=type(self).__name__, outcome='error')
+                if attempt == self.max_retries:
+                    raise
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+                print(f"Request failed: {e}, retrying in {delay:.1f}s")
+                time.sleep(delay)
 
-    def scrape(self):
-        raise NotImplementedError
+    # Returns (html, changed). With a cache, unchanged pages come back with
+    # changed=False so callers can skip parsing them again.
+    def fetch(self, url):
+        if self.cache is None:
+            return self.get(url).text, True
+        response = self.get(url, headers=self.cache.conditional_headers(url))
+        return self.cache.update(url, response)
+
+    def parse(self, html):
+        if self.extractor is None:
+            raise NotImplementedError
+        return self.extractor.extract(html)
 
-class ExpediaScraper(BaseScraper):
     def scrape(self):
-        url = "https://www.expedia.com/Hotels"
-        response = self.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
         hotels = []
-        for hotel in soup.find_all('div', class_='hotel-info'):
-            name = hotel.find('h3', class_='hotel-name').text.strip()
-            price = hotel.find('span', class_='price').text.strip()
-            rating = hotel.find('span', class_='rating').text.strip()
-            amenities = [a.text.strip() for a in hotel.find_all('li', class_='amenity')]
-            hotels.append({
-                "name": name,
-                "price": price,
-                "rating": rating,
-                "amenities": amenities,
-                "source": "Expedia"
-            })
+        for url in self.start_urls:
+            html, changed = self.fetch(url)
+            if changed:
+                hotels.extend(self.parse(html))
+        if self.cache is not None:
+            self.cache.flush()
         return hotels
 
+class ExpediaScraper(BaseScraper):
+    start_urls = ["https://www.expedia.com/Hotels"]
+    selectors = CardSelectors(
+        card=('div', 'hotel-info'),
+        fields={
+            "name": ('h3', 'hotel-name'),
+            "price": ('span', 'price'),
+            "rating": ('span', 'rating'),
+        },
+        lists={"amenities": ('li', 'amenity')},
+        source="Expedia",
+    )
+
 class BookingScraper(BaseScraper):
-    def scrape(self):
-        url = "https://www.booking.com/"
-        # Implement Booking.com scraping logic
-        pass
+    start_urls = ["https://www.booking.com/"]
+
+    def parse(self, html):
+        # Implement Booking.com scraping logic as CardSelectors
+        return []
 
 class AirbnbScraper(BaseScraper):
-    def scrape(self):
-        url = "https://www.airbnb.com/"
-        # Implement Airbnb scraping logic
-        pass
+    start_urls = ["https://www.airbnb.com/"]
+
+    def parse(self, html):
+        # Implement Airbnb scraping logic as CardSelectors
+        return []
+
+class ScrapeEngine:
+    # Fetches every page of every scraper on a shared thread pool, with at
+    # most `per_source` requests in flight per source, and yields parsed
+    # records as soon as each page completes. A page is only submitted once
+    # its source has a free slot, so pool workers never wait on a slow
+    # source while other sources have pages ready.
+    def __init__(self, scrapers, max_workers=SCRAPE_WORKERS, per_source=SOURCE_CONCURRENCY):
+        self.scrapers = scrapers
+        self.max_workers = max_workers
+        self.per_source = per_source
+        self.stats = {}
+
+    def fetch_page(self, name, url):
+        scraper = self.scrapers[name]
+        html, changed = scraper.fetch(url)
+        return scraper.parse(html) if changed else []
+
+    def stream(self):
+        start = time.perf_counter()
+        pages = failures = records = 0
+        backlog = {name: iter(scraper.start_urls) for name, scraper in self.scrapers.items()}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {}
+
+            def submit_next(name):
+                url = next(backlog[name], None)
+                if url is not None:
+                    futures[executor.submit(self.fetch_page, name, url)] = (name, url)
+
+            # Fill the slots round robin, so no source is queued behind another
+            for _ in range(self.per_source):
+                for name in self.scrapers:
+                    submit_next(name)
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, url = futures.pop(future)
+                    submit_next(name)
+                    try:
+                        hotels = future.result()
+                    except Exception as e:
+                        failures += 1
+                        print(f"Error scraping {name} ({url}): {str(e)}")
+                        continue
+                    pages += 1
+                    records += len(hotels)
+                    yield from hotels
+        for scraper in self.scrapers.values():
+            if scraper.cache is not None:
+                scraper.cache.flush()
+        elapsed = time.perf_counter() - start
+        self.stats = {
+            'pages': pages,
+            'failures': failures,
+            'records': records,
+            'seconds': elapsed,
+            'pages_per_sec': pages / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def collect(self):
+        return list(self.stream())
+
+class BloomFilter:
+    # Fixed-size bit array with k double-hashed probes per key. Used to
+    # deduplicate streamed rows in O(1) memory per cycle, at the cost of
+    # dropping roughly `error_rate` of genuinely new rows.
+    def __init__(self, capacity, error_rate=1e-4):
+        self.num_bits = int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = np.zeros((self.num_bits + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, h1, h2):
+        probes = np.arange(self.num_hashes, dtype=np.uint64)
+        return (h1[:, None] + probes * (h2[:, None] | np.uint64(1))) % np.uint64(self.num_bits)
+
+    def contains(self, h1, h2):
+        positions = self._positions(h1, h2)
+        return ((self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1).astype(bool)
+
+    def add(self, h1, h2):
+        positions = self._positions(h1, h2).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+
+class StreamSample:
+    # Uniform sample of at most max_rows rows from a stream of DataFrame
+    # chunks: every row gets a random key and the max_rows smallest keys are
+    # kept, so memory stays bounded by max_rows plus one chunk.
+    def __init__(self, max_rows=TRAIN_SAMPLE_ROWS, seed=None):
+        self.max_rows = max_rows
+        self.rng = np.random.default_rng(seed)
+        self.rows = None
+        self.keys = np.empty(0)
+        self.seen = 0
+
+    def add(self, chunk):
+        self.seen += len(chunk)
+        keys = np.concatenate([self.keys, self.rng.random(len(chunk))])
+        rows = chunk if self.rows is None else pd.concat([self.rows, chunk])
+        if len(rows) > self.max_rows:
+            keep = np.argpartition(keys, self.max_rows)[:self.max_rows]
+            keep.sort()
+            rows, keys = rows.iloc[keep], keys[keep]
+        self.rows, self.keys = rows, keys
+
+    def __len__(self):
+        return 0 if self.rows is None else len(self.rows)
+
+    def frame(self):
+        return self.rows
 
 class DataProcessor:
-    def __init__(self):
+    # In incremental mode the scaler is updated with partial_fit and the
+    # `source` one-hot columns come from a fixed vocabulary, both persisted
+    # to state_path, so each cycle only processes its new rows and still
+    # produces features on the same scale as earlier cycles.
+    def __init__(self, incremental=False, state_path=None, sources=SOURCES, price_history=None):
         self.scaler = StandardScaler()
+        self.price_history = price_history
+        self.incremental = incremental
+        self.state_path = state_path
+        self.sources = list(sources)
+        if incremental and state_path and os.path.exists(state_path):
+            self.load_state()
 
+    @instrumentation.timed('data_process_seconds', "DataProcessor.process latency")
     def process(self, raw_data):
         df = pd.DataFrame(raw_data)
         df = self.clean(df)
-        df = self.transform(df)
-        return self.validate(df)
+        df = self.parse(df)
+        df = self.validate(df)
+        return self.transform(df)
 
     def clean(self, df):
         df.dropna(inplace=True)
-        df.drop_duplicates(inplace=True)
+        # amenities holds lists, which are unhashable, so dedup on the identity columns
+        df.drop_duplicates(subset=['name', 'source'], inplace=True)
+        return df
+
+    # Vectorized string -> number parsing, no per-row apply
+    def parse(self, df):
+        df['price'] = pd.to_numeric(df['price'].astype(str).str.replace(r'[^0-9.\-]', '', regex=True), errors='coerce')
+        df['rating'] = pd.to_numeric(df['rating'], errors='coerce')
+        df['amenities_count'] = df['amenities'].str.len()
         return df
 
     def transform(self, df):
-        df['price'] = df['price'].str.replace('$', '').astype(float)
-        df['rating'] = df['rating'].astype(float)
-        df['amenities_count'] = df['amenities'].apply(len)
+        if self.incremental:
+            return self.transform_partial(df)
         df = pd.get_dummies(df, columns=['source'])
-        
-        numeric_columns = ['price', 'rating', 'amenities_count']
-        df[numeric_columns] = self.scaler.fit_transform(df[numeric_columns])
-        
+        df[NUMERIC_COLUMNS] = self.scaler.fit_transform(df[NUMERIC_COLUMNS])
         return df
 
+    # Fixed source vocabulary and a partial_fit scaler, so every batch gets
+    # the same columns and one running scale
+    def transform_partial(self, df):
+        source = pd.Categorical(df.pop('source'), categories=self.sources)
+        df = df.join(pd.get_dummies(source, prefix='source', dtype=bool).set_index(df.index))
+        if len(df):
+            self.scaler.partial_fit(df[NUMERIC_COLUMNS])
+            df[NUMERIC_COLUMNS] = self.scaler.transform(df[NUMERIC_COLUMNS])
+        if self.state_path:
+            self.save_state()
+        return df
+
+    # Streaming mode: records (any iterable, e.g. ScrapeEngine.stream()) are
+    # consumed in fixed-size chunks, so memory stays bounded by chunk_size.
+    # Yields (processed_chunk, errors) where errors lists the rows that
+    # failed validation instead of aborting the whole batch. Chunks always
+    # go through transform_partial, whatever `incremental` says, so the
+    # output does not depend on chunk_size.
+    def process_stream(self, records, chunk_size=CHUNK_SIZE, capacity=BLOOM_CAPACITY):
+        seen = BloomFilter(capacity)
+        records = iter(records)
+        while True:
+            chunk = list(itertools.islice(records, chunk_size))
+            if not chunk:
+                return
+            start = time.perf_counter()
+            df = self.clean(pd.DataFrame(chunk))
+            keys = df[['name', 'source']]
+            h1 = pd.util.hash_pandas_object(keys, index=False).values
+            h2 = pd.util.hash_pandas_object(keys, index=False, hash_key="bloom-filter-key").values
+            new = ~seen.contains(h1, h2)
+            seen.add(h1[new], h2[new])
+            df = self.parse(df[new])
+            df, errors = self.validate_rows(df)
+            if self.price_history is not None:
+                # Raw prices, before scaling, keyed per listing
+                self.price_history.append_many(df['source'] + ":" + df['name'], np.full(len(df), int(time.time())), df['price'])
+            df = self.transform_partial(df)
+            instrumentation.observe('data_process_chunk_seconds', time.perf_counter() - start, "DataProcessor stream chunk latency")
+            instrumentation.inc('data_processed_rows_total', len(df), "Rows accepted by DataProcessor")
+            instrumentation.inc('data_rejected_rows_total', len(errors), "Rows rejected by DataProcessor validation")
+            yield df, errors
+
+    def validate_rows(self, df):
+        checks = {
+            "Negative or missing price": ~(df['price'] >= 0),
+            "Invalid rating": ~df['rating'].between(0, 5),
+            # The one-hot vocabulary is fixed, so other sources would encode as no source at all
+            "Unknown source": ~df['source'].isin(self.sources),
+        }
+        failed = np.zeros(len(df), dtype=bool)
+        for mask in checks.values():
+            failed |= mask.values
+        rejected = df[failed]
+        errors = [
+            {"name": name, "source": source, "errors": [message for message, mask in checks.items() if mask.loc[index]]}
+            for index, name, source in zip(rejected.index, rejected['name'], rejected['source'])
+        ]
+        return df[~failed], errors
+
     def validate(self, df):
         assert df['price'].min() >= 0, "Negative prices found"
         assert df['rating'].between(0, 5).all(), "Invalid ratings found"
         assert df['name'].nunique() == len(df), "Duplicate hotel names found"
+        if self.incremental:
+            # Same check as validate_rows, which streaming runs in either mode
+            unknown = sorted(set(df['source']) - set(self.sources))
+            if unknown:
+                raise ValueError(f"Unknown sources found: {', '.join(map(str, unknown))}")
         return df
 
+    def save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({'scaler': self.scaler, 'sources': self.sources}, f)
+        os.replace(tmp_path, self.state_path)
+
+    def load_state(self):
+        with open(self.state_path, "rb") as f:
+            state = pickle.load(f)
+        self.scaler = state['scaler']
+        self.sources = state['sources']
+
+class PriceHistoryStore:
+    # Append-only (hotel, timestamp, price) observations kept as columns
+    # (int32 hotel id, int64 epoch seconds, float32 price) in time
+    # partitions of `partition_seconds`. Queries only touch partitions that
+    # overlap the requested range. Each partition is one .npz file when a
+    # directory is given; only the `max_cached` most recently used ones stay
+    # in memory, the rest are reloaded from disk on demand.
+    def __init__(self, directory=None, partition_seconds=86400, max_cached=HISTORY_CACHED_PARTITIONS):
+        self.directory = directory
+        self.partition_seconds = partition_seconds
+        self.max_cached = max_cached
+        self.hotel_ids = {}
+        self.hotels = []
+        self.saved_hotels = 0
+        self.partitions = OrderedDict()
+        self.counts = {}
+        self.pending = {}
+        self.lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self.load()
+
+    def __len__(self):
+        with self.lock:
+            pending = sum(len(ids) for chunks in self.pending.values() for ids, _, _ in chunks)
+            return sum(self.counts.values()) + pending
+
+    def _intern(self, hotels):
+        ids = np.empty(len(hotels), dtype=np.int32)
+        for i, hotel in enumerate(hotels):
+            hotel_id = self.hotel_ids.get(hotel)
+            if hotel_id is None:
+                hotel_id = self.hotel_ids[hotel] = len(self.hotels)
+                self.hotels.append(hotel)
+            ids[i] = hotel_id
+        return ids
+
+    def append(self, hotel, timestamp, price):
+        self.append_many([hotel], [timestamp], [price])
+
+    def append_many(self, hotels, timestamps, prices):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float32)
+        with self.lock:
+            ids = self._intern(list(hotels))
+            keys = timestamps // self.partition_seconds
+            for key in np.unique(keys):
+                mask = keys == key
+                self.pending.setdefault(int(key), []).append((ids[mask], timestamps[mask], prices[mask]))
+
+    # Merge pending appends into the partition, sorted by (hotel, timestamp)
+    def _partition(self, key):
+        chunks = self.pending.pop(key, [])
+        current = self.partitions.get(key)
+        if current is None and self.directory and os.path.exists(self._path(key)):
+            with np.load(self._path(key)) as f:
+                current = (f['hotel'], f['timestamp'], f['price'])
+        if chunks:
+            parts = ([current] if current is not None else []) + chunks
+            hotel, timestamp, price = (np.concatenate(column) for column in zip(*parts))
+            order = np.lexsort((timestamp, hotel))
+            current = (hotel[order], timestamp[order], price[order])
+            if self.directory:
+                self._write_partition(key, current)
+        if current is None:
+            current = (np.empty(0, np.int32), np.empty(0, np.int64), np.empty(0, np.float32))
+        self.partitions[key] = current
+        self.partitions.move_to_end(key)
+        self.counts[key] = len(current[0])
+        return current
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"prices-{key}.npz")
+
+    # A partition may reference hotel ids interned since the last save, so
+    # hotels.json is brought up to date before any partition is replaced
+    def _write_partition(self, key, current):
+        self._save_hotels()
+        tmp_path = self._path(key) + ".tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, hotel=current[0], timestamp=current[1], price=current[2])
+        os.replace(tmp_path, self._path(key))
+
+    def _save_hotels(self):
+        if self.saved_hotels == len(self.hotels):
+            return
+        hotels_path = os.path.join(self.directory, "hotels.json")
+        with open(hotels_path + ".tmp", "w") as f:
+            json.dump(self.hotels, f)
+        os.replace(hotels_path + ".tmp", hotels_path)
+        self.saved_hotels = len(self.hotels)
+
+    # Row count from the .npy header inside the archive, without reading
+    # the partition's data
+    def _stored_count(self, key):
+        with zipfile.ZipFile(self._path(key)) as archive, archive.open("price.npy") as f:
+            if np.lib.format.read_magic(f) == (1, 0):
+                shape, _, _ = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, _, _ = np.lib.format.read_array_header_2_0(f)
+        return shape[0]
+
+    # Drop the least recently used partitions that are already on disk
+    def _evict(self):
+        if not self.directory:
+            return
+        loaded = [key for key, current in self.partitions.items() if current is not None]
+        for key in loaded[:max(len(loaded) - self.max_cached, 0)]:
+            self.partitions[key] = None
+
+    def flush(self):
+        with self.lock:
+            for key in list(self.pending):
+                self._partition(key)
+            self._evict()
+
+    def load(self):
+        hotels_path = os.path.join(self.directory, "hotels.json")
+        if os.path.exists(hotels_path):
+            with open(hotels_path) as f:
+                self.hotels = json.load(f)
+        self.saved_hotels = len(self.hotels)
+        self.hotel_ids = {hotel: i for i, hotel in enumerate(self.hotels)}
+        for filename in os.listdir(self.directory):
+            if filename.startswith("prices-") and filename.endswith(".npz"):
+                key = int(filename[len("prices-"):-len(".npz")])
+                self.partitions.setdefault(key, None)
+                self.counts[key] = self._stored_count(key)
+
+    def save(self):
+        with self.lock:
+            self._save_hotels()
+        self.flush()
+
+    def scan(self, start=None, end=None, hotels=None):
+        with self.lock:
+            keys = sorted(set(self.partitions) | set(self.pending))
+            if start is not None:
+                keys = [key for key in keys if key >= start // self.partition_seconds]
+            if end is not None:
+                keys = [key for key in keys if key <= end // self.partition_seconds]
+            parts = [self._partition(key) for key in keys]
+            self._evict()
+            hotel_filter = None if hotels is None else np.array([self.hotel_ids.get(h, -1) for h in hotels])
+        if not parts:
+            return np.empty(0, np.int32), np.empty(0, np.int64), np.empty(0, np.float32)
+        hotel, timestamp, price = (np.concatenate(column) for column in zip(*parts))
+        mask = np.ones(len(hotel), dtype=bool)
+        if start is not None:
+            mask &= timestamp >= start
+        if end is not None:
+            mask &= timestamp < end
+        if hotel_filter is not None:
+            mask &= np.isin(hotel, hotel_filter)
+        order = np.lexsort((timestamp[mask], hotel[mask]))
+        return hotel[mask][order], timestamp[mask][order], price[mask][order]
+
+    def history(self, hotel, start=None, end=None):
+        _, timestamps, prices = self.scan(start, end, [hotel])
+        return timestamps, prices
+
+    # Aggregate into `freq_seconds` buckets per hotel, e.g. hourly -> daily
+    def rollup(self, freq_seconds=86400, agg='mean', start=None, end=None, hotels=None):
+        hotel, timestamp, price = self.scan(start, end, hotels)
+        frame = pd.DataFrame({'hotel': hotel, 'bucket': timestamp // freq_seconds * freq_seconds, 'price': price})
+        rolled = frame.groupby(['hotel', 'bucket'], sort=True)['price'].agg(agg).reset_index()
+        rolled['hotel'] = np.asarray(self.hotels, dtype=object)[rolled['hotel'].values] if len(rolled) else []
+        return rolled
+
+    # Sliding (window -> next price) samples over each hotel's series,
+    # shaped (n, window, 1) for the LSTM
+    def windows(self, window, freq_seconds=None, start=None, end=None, hotels=None):
+        if freq_seconds:
+            rolled = self.rollup(freq_seconds, start=start, end=end, hotels=hotels)
+            hotel = pd.factorize(rolled['hotel'])[0]
+            price = rolled['price'].values.astype(np.float32)
+        else:
+            hotel, _, price = self.scan(start, end, hotels)
+        boundaries = np.flatnonzero(np.diff(hotel)) + 1
+        samples = [
+            np.lib.stride_tricks.sliding_window_view(series, window + 1)
+            for series in np.split(price, boundaries)
+            if len(series) > window
+        ]
+        if not samples:
+            return np.empty((0, window, 1), np.float32), np.empty(0, np.float32)
+        samples = np.concatenate(samples)
+        return samples[:, :window, np.newaxis], samples[:, window]
+
+# Models only see numeric columns; name and the amenities lists are dropped
+def feature_frame(data):
+    return data.drop(columns='price', errors='ignore').select_dtypes(include=[np.number, bool]).astype(np.float32)
+
 class DeepLearningModel:
     def __init__(self):
         self.model = Sequential([
@@ -132,45 +957,354 @@ class DeepLearningModel:
         ])
         self.model.compile(optimizer='adam', loss='mse')
 
-    def train(self, data):
-        X = data.drop('price', axis=1).values
+    def train(self, data, epochs=100, callbacks=None):
+        X = feature_frame(data).values
         y = data['price'].values
         X = X.reshape((X.shape[0], X.shape[1], 1))
-        self.model.fit(X, y, epochs=100, batch_size=32, validation_split=0.2)
+        return self.model.fit(X, y, epochs=epochs, batch_size=32, validation_split=0.2, callbacks=callbacks)
+
+    # Train on real price sequences instead of reshaped feature rows. A model
+    # trained this way forecasts raw prices from a price window and is kept
+    # apart from the ensemble members, which predict the scaled price. Only
+    # the last `periods` buckets are read so the cost does not grow with the
+    # full history.
+    def train_on_history(self, store, window=HISTORY_WINDOW, freq_seconds=HISTORY_FREQ, periods=HISTORY_TRAIN_PERIODS,
+                         epochs=100, callbacks=None):
+        start = None
+        if periods:
+            freq = freq_seconds or store.partition_seconds
+            start = (int(time.time()) // freq - periods) * freq
+        X, y = store.windows(window, freq_seconds=freq_seconds, start=start)
+        if len(X) == 0:
+            return None
+        return self.model.fit(X, y, epochs=epochs, batch_size=32, validation_split=0.2, callbacks=callbacks)
 
     def predict(self, features):
+        if self.model is None:
+            self.model = load_model(self.path)
         features = features.reshape((features.shape[0], features.shape[1], 1))
+        if len(features) <= 32:
+            # Skips predict()'s per-call dataset setup for request-sized batches
+            return np.asarray(self.model.predict_on_batch(features))
         return self.model.predict(features)
 
+    # With lazy=True nothing touches TensorFlow until the first predict, so a
+    # pre-fork server master can load the rest of the ensemble safely
+    @classmethod
+    def from_file(cls, path, lazy=False):
+        dl_model = cls.__new__(cls)
+        dl_model.path = path
+        dl_model.model = None if lazy else load_model(path)
+        return dl_model
+
+    def save_weights(self, path):
+        self.model.save_weights(path)
+
+    def load_weights(self, path):
+        self.model.load_weights(path)
+
+# Keras only accepts weight files ending in .weights.h5, so related state
+# is named by replacing that suffix
+def sibling_path(weights_path, suffix):
+    base = weights_path[:-len(".weights.h5")] if weights_path.endswith(".weights.h5") else os.path.splitext(weights_path)[0]
+    return f"{base}.{suffix}"
+
+# Split the cores between the members so concurrent fits don't oversubscribe
+# the CPU: gradient boosting is single threaded, the forest gets half of the
+# rest and TensorFlow's thread pools are limited to what is left for the LSTM.
+def partition_cores(total=TRAIN_CORES):
+    rf = max(1, (total - 1) // 2)
+    return {'rf': rf, 'gb': 1, 'dl': max(1, total - rf - 1)}
+
+# TensorFlow sizes its thread pools once, when its runtime starts, so the
+# LSTM's share has to be applied before the first model is built. Returns
+# whether the limit is in effect.
+def limit_tf_threads(threads):
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(threads)
+        tf.config.threading.set_inter_op_parallelism_threads(1)
+        return True
+    except RuntimeError:
+        print(f"TensorFlow is already initialized, the LSTM cannot be limited to {threads} threads")
+        return False
+
+# Runs in a pool worker; the fitted estimator is pickled back to the parent
+def fit_member(model, X, y, n_jobs=None):
+    if n_jobs is not None and 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+    start = time.perf_counter()
+    model.fit(X, y)
+    return model, time.perf_counter() - start
+
+# Builds the model input matrix straight from request dicts, in the column
+# order the ensemble was trained on, without going through a DataFrame.
+# Features missing from a record default to 0.0, the scaled mean / a false
+# one-hot flag.
+class FeatureAssembler:
+    def __init__(self, feature_names):
+        self.feature_names = list(feature_names)
+        self.getter = operator.itemgetter(*self.feature_names)
+
+    def assemble(self, records):
+        X = np.empty((len(records), len(self.feature_names)), dtype=np.float32)
+        for i, record in enumerate(records):
+            try:
+                X[i] = self.getter(record)
+            except KeyError:
+                X[i] = [record.get(name, 0.0) for name in self.feature_names]
+        return X
+
+    # Pickle by feature names; itemgetter is rebuilt on load
+    def __reduce__(self):
+        return (FeatureAssembler, (self.feature_names,))
+
 class EnsembleModel:
-    def __init__(self):
-        self.rf_model = RandomForestRegressor()
-        self.gb_model = GradientBoostingRegressor()
-        self.dl_model = DeepLearningModel()
+    # In incremental mode a retrain only fits the new batch: the forest and
+    # boosting models warm start and grow trees_per_update extra trees/stages,
+    # and the LSTM continues from its saved weights for a few epochs with
+    # early stopping. Batches that have not drifted from the data of the last
+    # retrain are skipped entirely. Growth is capped at max_estimators (see
+    # grow_trees). The trees and drift reference are saved
+    # next to weights_path, so a restarted process continues incrementally.
+    # In parallel mode the forest and boosting models are fitted in a process
+    # pool while the LSTM trains in this process on its share of the cores
+    # (set before TensorFlow starts), and predict evaluates the
+    # three members concurrently on threads.
+    # With a price history the ensemble also trains `forecaster`, an LSTM
+    # over raw price windows used by forecast(); it never enters the average.
+    def __init__(self, price_history=None, incremental=False, weights_path=None, drift_threshold=DRIFT_THRESHOLD,
+                 trees_per_update=TREES_PER_UPDATE, max_estimators=MAX_ESTIMATORS, dl_epochs=100, dl_update_epochs=LSTM_UPDATE_EPOCHS,
+                 parallel=False, cores=TRAIN_CORES, mp_context='spawn', dl_model=None):
+        self.parallel = parallel
+        self.cores = partition_cores(cores)
+        self.tf_threads_limited = parallel and limit_tf_threads(self.cores['dl'])
+        self.rf_model = RandomForestRegressor(warm_start=incremental)
+        self.gb_model = GradientBoostingRegressor(warm_start=incremental)
+        self.dl_model = dl_model if dl_model is not None else DeepLearningModel()
+        self.forecaster = None
+        self.price_history = price_history
+        self.incremental = incremental
+        self.weights_path = weights_path
+        self.drift_threshold = drift_threshold
+        self.trees_per_update = trees_per_update
+        self.max_estimators = max_estimators
+        self.dl_epochs = dl_epochs
+        self.dl_update_epochs = dl_update_epochs
+        self.reference = None
+        self.feature_names = None
+        self.assembler = None
+        self.training_times = {}
+        self.mp_context = mp_context
+        self.process_pool = None
+        self.thread_pool = None
+        if incremental and weights_path and os.path.exists(weights_path):
+            self.dl_model.load_weights(weights_path)
+        if incremental and weights_path and os.path.exists(sibling_path(weights_path, "trees.joblib")):
+            self.load_trees(sibling_path(weights_path, "trees.joblib"))
+        if incremental and weights_path and os.path.exists(sibling_path(weights_path, "forecaster.weights.h5")):
+            self.forecaster = DeepLearningModel()
+            self.forecaster.load_weights(sibling_path(weights_path, "forecaster.weights.h5"))
+
+    # Largest shift of a column mean, in units of the reference std, between
+    # this batch and the one the models were last trained on
+    def drift(self, data):
+        if self.reference is None:
+            return np.inf
+        columns, mean, std = self.reference
+        current = feature_frame(data).assign(price=data['price'])
+        if list(current.columns) != columns:
+            return np.inf
+        return float(np.max(np.abs(current.mean().values - mean) / (std + 1e-9)))
+
+    # Add trees_per_update trees/stages without passing max_estimators. Forest
+    # trees are independent, so the oldest ones are dropped to make room;
+    # boosting stages each correct the ones before them, so a full booster
+    # is refitted from scratch instead.
+    def grow_trees(self):
+        rf_trees = self.rf_model.n_estimators + self.trees_per_update
+        if rf_trees > self.max_estimators:
+            keep = max(self.max_estimators - self.trees_per_update, 0)
+            self.rf_model.estimators_ = self.rf_model.estimators_[len(self.rf_model.estimators_) - keep:]
+            rf_trees = keep + self.trees_per_update
+        self.rf_model.n_estimators = rf_trees
+        if self.gb_model.n_estimators + self.trees_per_update > self.max_estimators:
+            self.gb_model = GradientBoostingRegressor(warm_start=True)
+        else:
+            self.gb_model.n_estimators += self.trees_per_update
 
     def train(self, data):
-        X = data.drop('price', axis=1)
+        X = feature_frame(data)
         y = data['price']
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2)
+
+        warm = False
+        if self.incremental:
+            drift = self.drift(data)
+            if drift < self.drift_threshold:
+                print(f"Skipping retrain, drift {drift:.3f} below {self.drift_threshold}")
+                self.training_times = {}
+                return False
+            if self.reference is not None and np.isfinite(drift):
+                warm = True
+                self.grow_trees()
+            elif self.reference is not None:
+                # The feature columns changed, so the trees cannot be extended
+                self.rf_model = RandomForestRegressor(warm_start=True)
+                self.gb_model = GradientBoostingRegressor(warm_start=True)
+
+        # Trees are fitted on plain arrays so serving can skip DataFrames
+        X_train, X_test, y_train = X_train.values, X_test.values, y_train.values
+        times = {}
+        if self.parallel:
+            pool = self.processes()
+            futures = {
+                'rf': pool.submit(fit_member, self.rf_model, X_train, y_train, self.cores['rf']),
+                'gb': pool.submit(fit_member, self.gb_model, X_train, y_train, self.cores['gb']),
+            }
+            times['dl'] = self.fit_dl(data, warm)
+            times['forecaster'] = self.fit_forecaster(warm)
+            self.rf_model, times['rf'] = futures['rf'].result()
+            self.gb_model, times['gb'] = futures['gb'].result()
+        else:
+            self.rf_model, times['rf'] = fit_member(self.rf_model, X_train, y_train)
+            self.gb_model, times['gb'] = fit_member(self.gb_model, X_train, y_train)
+            times['dl'] = self.fit_dl(data, warm)
+            times['forecaster'] = self.fit_forecaster(warm)
+        if times['forecaster'] is None:
+            del times['forecaster']
+        self.training_times = times
+        for component, seconds in times.items():
+            instrumentation.observe('ensemble_train_seconds', seconds, "EnsembleModel training time per member", component=component)
+        self.feature_names = list(X.columns)
+        self.assembler = FeatureAssembler(self.feature_names)
+
+        if self.incremental:
+            reference = X.assign(price=y)
+            self.reference = (list(reference.columns), reference.mean().values, reference.std().values)
+            if self.weights_path:
+                self.save_trees(sibling_path(self.weights_path, "trees.joblib"))
         
-        self.rf_model.fit(X_train, y_train)
-        self.gb_model.fit(X_train, y_train)
-        self.dl_model.train(data)
-        
-        rf_pred = self.rf_model.predict(X_test)
-        gb_pred = self.gb_model.predict(X_test)
-        dl_pred = self.dl_model.predict(X_test.values)
+        rf_pred, gb_pred, dl_pred = self.member_predictions(X_test)
         
         ensemble_pred = (rf_pred + gb_pred + dl_pred.flatten()) / 3
         mse = mean_squared_error(y_test, ensemble_pred)
         print(f"Ensemble Model MSE: {mse}")
+        print("Training time: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in times.items()))
+        return True
+
+    def fit_dl(self, data, warm):
+        start = time.perf_counter()
+        epochs = self.dl_update_epochs if warm else self.dl_epochs
+        callbacks = [EarlyStopping(patience=2, restore_best_weights=True)] if warm else None
+        self.dl_model.train(data, epochs=epochs, callbacks=callbacks)
+        if self.incremental and self.weights_path:
+            self.dl_model.save_weights(self.weights_path)
+        return time.perf_counter() - start
+
+    # Returns None when there is no history long enough to window yet
+    def fit_forecaster(self, warm):
+        if self.price_history is None or not len(self.price_history):
+            return None
+        start = time.perf_counter()
+        forecaster = self.forecaster if self.forecaster is not None else DeepLearningModel()
+        warm = warm and forecaster is self.forecaster
+        epochs = self.dl_update_epochs if warm else self.dl_epochs
+        callbacks = [EarlyStopping(patience=2, restore_best_weights=True)] if warm else None
+        if forecaster.train_on_history(self.price_history, epochs=epochs, callbacks=callbacks) is None:
+            return None
+        self.forecaster = forecaster
+        if self.incremental and self.weights_path:
+            forecaster.save_weights(sibling_path(self.weights_path, "forecaster.weights.h5"))
+        return time.perf_counter() - start
+
+    # Next price for each (n, HISTORY_WINDOW) window of raw daily prices
+    def forecast(self, prices):
+        if self.forecaster is None:
+            raise LookupError("No price history forecaster has been trained")
+        return self.forecaster.predict(np.asarray(prices, dtype=np.float32)).flatten()
+
+    def member_predictions(self, X):
+        if not self.parallel:
+            return self.rf_model.predict(X), self.gb_model.predict(X), self.dl_model.predict(X)
+        threads = self.threads()
+        futures = [
+            threads.submit(self.rf_model.predict, X),
+            threads.submit(self.gb_model.predict, X),
+            threads.submit(self.dl_model.predict, X),
+        ]
+        return [future.result() for future in futures]
 
     def predict(self, features):
-        rf_pred = self.rf_model.predict(features)
-        gb_pred = self.gb_model.predict(features)
-        dl_pred = self.dl_model.predict(features.values)
+        X = feature_frame(features).reindex(columns=self.feature_names, fill_value=0.0).values
+        return self.predict_array(X)
+
+    def predict_array(self, X):
+        rf_pred, gb_pred, dl_pred = self.member_predictions(X)
         return (rf_pred + gb_pred + dl_pred.flatten()) / 3
 
+    def predict_records(self, records):
+        return self.predict_array(self.assembler.assemble(records))
+
+    # The pools are created on first use and reused, so the worker start-up
+    # cost is paid once rather than on every retrain
+    def processes(self):
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context(self.mp_context))
+        return self.process_pool
+
+    def threads(self):
+        if self.thread_pool is None:
+            self.thread_pool = ThreadPoolExecutor(max_workers=3)
+        return self.thread_pool
+
+    def close(self):
+        for pool in (self.process_pool, self.thread_pool):
+            if pool is not None:
+                pool.shutdown()
+        self.process_pool = self.thread_pool = None
+
+    # Compile the predict paths on one dummy row so the first real request
+    # after a model swap doesn't pay for it
+    def warm_up(self):
+        self.predict_array(np.zeros((1, len(self.feature_names)), dtype=np.float32))
+
+    def save_trees(self, path):
+        joblib.dump({'rf': self.rf_model, 'gb': self.gb_model, 'reference': self.reference, 'feature_names': self.feature_names,
+                     'parallel': self.parallel}, path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+    def load_trees(self, path, mmap_mode=None):
+        trees = joblib.load(path, mmap_mode=mmap_mode)
+        self.rf_model, self.gb_model, self.reference = trees['rf'], trees['gb'], trees['reference']
+        self.feature_names = trees['feature_names']
+        self.assembler = FeatureAssembler(self.feature_names) if self.feature_names is not None else None
+        return trees
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.save_trees(os.path.join(directory, "trees.joblib"))
+        self.dl_model.model.save(os.path.join(directory, "lstm.keras"))
+        if self.forecaster is not None:
+            self.forecaster.model.save(os.path.join(directory, "forecaster.keras"))
+
+    # Tree arrays are memory-mapped where the estimators allow it. Members
+    # are evaluated concurrently if the saved model was parallel, unless
+    # `parallel` says otherwise.
+    @classmethod
+    def load(cls, directory, mmap_mode='r', lazy=False, parallel=None):
+        model = cls(dl_model=DeepLearningModel.from_file(os.path.join(directory, "lstm.keras"), lazy=lazy))
+        trees = model.load_trees(os.path.join(directory, "trees.joblib"), mmap_mode=mmap_mode)
+        model.parallel = trees.get('parallel', False) if parallel is None else parallel
+        if os.path.exists(os.path.join(directory, "forecaster.keras")):
+            model.forecaster = DeepLearningModel.from_file(os.path.join(directory, "forecaster.keras"), lazy=lazy)
+        return model
+
+    # Pools can't be pickled; a copy sent elsewhere recreates its own
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['process_pool'] = state['thread_pool'] = None
+        return state
+
 class RecommendationModel:
     def train(self, data):
         # Implement recommendation model training
@@ -181,9 +1315,9 @@ class RecommendationModel:
         pass
 
 class MachineLearningPipeline:
-    def __init__(self):
+    def __init__(self, price_history=None, incremental=False, weights_path=None, parallel=False):
         self.models = {
-            'price_predictor': EnsembleModel(),
+            'price_predictor': EnsembleModel(price_history, incremental=incremental, weights_path=weights_path, parallel=parallel),
             'recommendation_engine': RecommendationModel(),
         }
 
@@ -195,17 +1329,178 @@ class MachineLearningPipeline:
         return self.models
 
 class Database:
-    def __init__(self):
-        self.client = MongoClient(MONGO_URI)
+    # Hotels are upserted on (name, source) with unordered bulk writes in
+    # batches, so re-scraped hotels update in place instead of duplicating.
+    # Reads stream from a cursor as DataFrame chunks.
+    def __init__(self, client=None, write_batch_size=WRITE_BATCH_SIZE, sources=SOURCES):
+        self.client = client if client is not None else MongoClient(MONGO_URI)
         self.db = self.client[DB_NAME]
+        self.write_batch_size = write_batch_size
+        self.source_names = list(sources)
+        self.ensure_indexes()
+
+    # Collections written by the old insert_many store hold one document per
+    # hotel per cycle, with only the one-hot source_* flags. Those are
+    # migrated before the unique index can be built.
+    def ensure_indexes(self):
+        collection = self.db['hotels']
+        if collection.find_one({'source': {'$exists': False}}, {'_id': 1}) is not None:
+            self.backfill_sources()
+        try:
+            collection.create_index([('name', ASCENDING), ('source', ASCENDING)], unique=True)
+        except DuplicateKeyError:
+            removed = self.remove_duplicates()
+            print(f"Removed {removed} duplicate hotel documents before indexing (name, source)")
+            collection.create_index([('name', ASCENDING), ('source', ASCENDING)], unique=True)
+
+    def backfill_sources(self):
+        collection = self.db['hotels']
+        for source in self.source_names:
+            collection.update_many({'source': {'$exists': False}, f'source_{source}': True}, {'$set': {'source': source}})
+        missing = collection.count_documents({'source': {'$exists': False}})
+        if missing:
+            print(f"Warning: {missing} hotel documents have no known source")
+
+    # Keeps the newest document (highest _id) of each (name, source) group
+    def remove_duplicates(self):
+        collection = self.db['hotels']
+        groups = collection.aggregate([
+            {'$sort': {'_id': 1}},
+            {'$group': {'_id': {'name': '$name', 'source': '$source'}, 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+            {'$match': {'count': {'$gt': 1}}},
+        ], allowDiskUse=True)
+        removed = 0
+        for group in groups:
+            ids = group['ids'][:-1]
+            for start in range(0, len(ids), self.write_batch_size):
+                removed += collection.delete_many({'_id': {'$in': ids[start:start + self.write_batch_size]}}).deleted_count
+        return removed
+
+    @staticmethod
+    def sources(data):
+        if 'source' in data:
+            return data['source']
+        # Processed frames carry the one-hot source_* columns instead; a row
+        # with none set has no known source
+        source_columns = [column for column in data.columns if column.startswith('source_')]
+        one_hot = data[source_columns]
+        return one_hot.idxmax(axis=1).str[len('source_'):].where(one_hot.any(axis=1))
 
     def store(self, data):
         collection = self.db['hotels']
-        collection.insert_many(data.to_dict('records'))
+        sources = self.sources(data)
+        if sources.isna().any():
+            raise ValueError(f"{int(sources.isna().sum())} rows have no known source")
+        written = 0
+        for start in range(0, len(data), self.write_batch_size):
+            batch = data.iloc[start:start + self.write_batch_size]
+            operations = [
+                UpdateOne({'name': record['name'], 'source': source}, {'$set': {**record, 'source': source}}, upsert=True)
+                for record, source in zip(batch.to_dict('records'), sources.iloc[start:start + self.write_batch_size])
+            ]
+            result = collection.bulk_write(operations, ordered=False)
+            written += result.upserted_count + result.modified_count
+        return written
 
     def retrieve(self, query):
+        chunks = list(self.retrieve_chunks(query))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+    def retrieve_chunks(self, query=None, projection=None, chunk_size=READ_CHUNK_SIZE):
         collection = self.db['hotels']
-        return pd.DataFrame(list(collection.find(query)))
+        cursor = collection.find(query or {}, projection, batch_size=chunk_size)
+        while True:
+            documents = list(itertools.islice(cursor, chunk_size))
+            if not documents:
+                return
+            yield pd.DataFrame(documents)
+
+class ModelRegistry:
+    # Each trained pipeline is written to its own numbered version directory.
+    # A version is written under a temporary name and renamed into place, so
+    # readers never see a partial version. Only the newest `keep` versions
+    # stay on disk. The CURRENT file names the version every serving worker
+    # should run: publish moves it to the new version, a rollback moves it
+    # back, and each worker's watcher follows it.
+    def __init__(self, directory=MODEL_DIR, keep=KEEP_VERSIONS):
+        self.directory = directory
+        self.keep = keep
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, version):
+        return os.path.join(self.directory, f"v{version:06d}")
+
+    def versions(self):
+        return sorted(int(name[1:]) for name in os.listdir(self.directory) if name.startswith("v") and name[1:].isdigit())
+
+    def latest(self):
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    # Registries written before CURRENT existed serve their latest version
+    def current(self):
+        try:
+            with open(os.path.join(self.directory, "CURRENT")) as f:
+                version = int(f.read())
+        except (FileNotFoundError, ValueError):
+            return self.latest()
+        return version if os.path.isdir(self.path(version)) else self.latest()
+
+    def set_current(self, version):
+        current_path = os.path.join(self.directory, "CURRENT")
+        with open(current_path + ".tmp", "w") as f:
+            f.write(str(version))
+        os.replace(current_path + ".tmp", current_path)
+
+    def publish(self, models):
+        with self.lock:
+            version = (self.latest() or 0) + 1
+            tmp_path = os.path.join(self.directory, f".tmp-v{version:06d}")
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            os.makedirs(tmp_path)
+            formats = {}
+            for name, model in models.items():
+                if isinstance(model, EnsembleModel):
+                    model.save(os.path.join(tmp_path, name))
+                    formats[name] = 'ensemble'
+                else:
+                    joblib.dump(model, os.path.join(tmp_path, name + ".joblib"))
+                    formats[name] = 'joblib'
+            with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+                json.dump({'version': version, 'created': time.time(), 'models': formats}, f)
+            os.rename(tmp_path, self.path(version))
+            self.set_current(version)
+            self.prune()
+            return version
+
+    def load(self, version=None, mmap_mode='r', lazy=False, parallel=None):
+        version = self.current() if version is None else version
+        if version is None:
+            return None
+        path = self.path(version)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        models = {}
+        for name, format in meta['models'].items():
+            if format == 'ensemble':
+                models[name] = EnsembleModel.load(os.path.join(path, name), mmap_mode=mmap_mode, lazy=lazy, parallel=parallel)
+            else:
+                models[name] = joblib.load(os.path.join(path, name + ".joblib"), mmap_mode=mmap_mode)
+        return models
+
+    def prune(self):
+        current = self.current()
+        for version in self.versions()[:-self.keep]:
+            if version == current:
+                continue
+            shutil.rmtree(self.path(version), ignore_errors=True)
+
+# Per-hotel prediction cache keys: (model version, feature row hash). A
+# model swap changes the version, so stale entries are never hit; the swap
+# also clears them.
+def prediction_keys(version, X):
+    return [(version, hashlib.blake2b(row.tobytes(), digest_size=16).digest()) for row in X]
 
 def token_required(f):
     @wraps(f)
@@ -221,65 +1516,1196 @@ def token_required(f):
     return decorated
 
 class APIManager:
-    def __init__(self):
-        self.app = Flask(__name__)
-        self.models = None
+    # Requests read `current`, a (version, models) tuple that is never mutated,
+    # once per request. update_models and rollback build the replacement
+    # off the request path and swap the reference in one assignment, so a
+    # request always sees one complete, fully trained version.
+    # Background threads (coalescer, registry watcher) only run after
+    # start(), which a pre-fork server calls in each worker; with warm=False
+    # the initial load leaves TensorFlow untouched until then.
+    def __init__(self, registry=None, keep_loaded=KEEP_LOADED_VERSIONS, warm=True, poll_interval=MODEL_POLL_INTERVAL):
+        self.app = instrumentation.instrument_app(Flask(__name__))
+        self.registry = registry
+        self.keep_loaded = keep_loaded
+        self.poll_interval = poll_interval
+        self.loaded = OrderedDict()
+        self.swap_lock = threading.Lock()
+        self.current = (None, None)
+        # Versions for models swapped in without a registry
+        self.local_versions = itertools.count(1)
+        self.cache = batching.LRUCache(PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+        self.coalescer = self.make_coalescer()
+        self.stop_event = threading.Event()
+        self.watcher = None
+        self.seen_version = registry.current() if registry is not None else None
+        if self.seen_version is not None:
+            self.activate(self.seen_version, warm=warm)
+
+    @property
+    def models(self):
+        return self.current[1]
 
     def setup_routes(self):
         @self.app.route('/predict', methods=['POST'])
         @token_required
         def predict():
-            data = request.json
-            predictions = self.models['price_predictor'].predict(pd.DataFrame([data]))
-            return jsonify({"predicted_price": predictions[0]})
+            version, models = self.current
+            if models is None:
+                return jsonify({'message': 'No model loaded'}), 503
+            version, prediction = self.coalescer.submit(request.json).result()
+            return jsonify({"predicted_price": prediction, "model_version": version})
+
+        @self.app.route('/predict/batch', methods=['POST'])
+        @token_required
+        def predict_batch():
+            if self.current[1] is None:
+                return jsonify({'message': 'No model loaded'}), 503
+            hotels = (request.json or {}).get('hotels', [])
+            if len(hotels) > MAX_PREDICT_BATCH:
+                return jsonify({'message': f'At most {MAX_PREDICT_BATCH} hotels per call'}), 413
+            version, predictions = self.predict_records(hotels)
+            return jsonify({"predicted_prices": predictions, "model_version": version})
+
+        @self.app.route('/forecast', methods=['POST'])
+        @token_required
+        def forecast():
+            version, models = self.current
+            if models is None:
+                return jsonify({'message': 'No model loaded'}), 503
+            prices = (request.json or {}).get('prices', [])
+            if not prices:
+                return jsonify({"forecast": [], "model_version": version})
+            try:
+                forecast = models['price_predictor'].forecast(prices)
+            except LookupError as e:
+                return jsonify({'message': str(e)}), 404
+            return jsonify({"forecast": forecast.tolist(), "model_version": version})
+
+        @self.app.route('/predict/stats', methods=['GET'])
+        @token_required
+        def predict_stats():
+            return jsonify({"cache": self.cache.stats(), "coalescer": self.coalescer.stats()})
+
+        @self.app.route('/ready', methods=['GET'])
+        def ready():
+            ready = self.current[1] is not None and self.coalescer.thread.is_alive()
+            return jsonify({"ready": ready, "model_version": self.current[0]}), 200 if ready else 503
 
         @self.app.route('/recommend', methods=['POST'])
         @token_required
         def recommend():
+            version, models = self.current
+            if models is None:
+                return jsonify({'message': 'No model loaded'}), 503
             user_preferences = request.json
-            recommendations = self.models['recommendation_engine'].recommend(user_preferences)
+            recommendations = models['recommendation_engine'].recommend(user_preferences)
             return jsonify({"recommendations": recommendations})
 
+        @self.app.route('/models', methods=['GET'])
+        @token_required
+        def models():
+            return jsonify({
+                "current": self.current[0],
+                "loaded": list(self.loaded),
+                "versions": self.registry.versions() if self.registry is not None else [],
+            })
+
+        @self.app.route('/models/rollback', methods=['POST'])
+        @token_required
+        def rollback():
+            version = (request.json or {}).get('version')
+            try:
+                return jsonify({"current": self.rollback(version)})
+            except LookupError as e:
+                return jsonify({'message': str(e)}), 404
+
+    def start(self):
+        # Threads don't survive a fork, so each worker gets fresh ones
+        self.coalescer = self.make_coalescer().start()
+        for model in (self.current[1] or {}).values():
+            if hasattr(model, 'warm_up'):
+                model.warm_up()
+        if self.registry is not None:
+            self.stop_event.clear()
+            self.watcher = threading.Thread(target=self.watch, daemon=True)
+            self.watcher.start()
+        return self
+
+    # Follows the registry's current version, so publishes by the training
+    # process and rollbacks served by any worker reach every worker
+    def watch(self):
+        while not self.stop_event.wait(self.poll_interval):
+            current = self.registry.current()
+            if current is not None and current != self.seen_version:
+                self.activate(current)
+                self.seen_version = current
+
+    # One model version for the whole batch; only cache misses reach the models
+    def predict_records(self, records):
+        version, models = self.current
+        if not records:
+            return version, []
+        model = models['price_predictor']
+        X = model.assembler.assemble(records)
+        keys = prediction_keys(version, X)
+        predictions = np.array([np.nan if value is None else value for value in self.cache.get_many(keys)], dtype=float)
+        missing = np.isnan(predictions)
+        if missing.any():
+            predictions[missing] = model.predict_array(X[missing])
+            self.cache.put_many([key for key, miss in zip(keys, missing) if miss], predictions[missing])
+        return version, predictions.tolist()
+
+    # Concurrent single-hotel requests share one predict_records call; each
+    # future resolves to (version, prediction)
+    def make_coalescer(self):
+        def predict_batch(records):
+            version, predictions = self.predict_records(records)
+            return [(version, prediction) for prediction in predictions]
+        return batching.MicroBatcher(predict_batch, COALESCE_MAX_BATCH, COALESCE_MAX_LATENCY_MS)
+
+    # The live pipeline objects keep being retrained, so what gets served is
+    # a copy published to (and loaded back from) the registry
     def update_models(self, models):
-        self.models = models
+        if self.registry is None:
+            return self.swap(None, models)
+        version = self.registry.publish(models)
+        self.activate(version)
+        self.seen_version = version
+        return version
+
+    def activate(self, version, warm=True):
+        models = self.loaded.get(version)
+        if models is None:
+            models = self.registry.load(version, lazy=not warm)
+            for model in models.values():
+                if warm and hasattr(model, 'warm_up'):
+                    model.warm_up()
+        self.swap(version, models)
+
+    # Every distinct model set gets its own version, which keys the
+    # prediction cache; entries of the outgoing version are dropped
+    def swap(self, version, models):
+        with self.swap_lock:
+            if version is None:
+                version = next(self.local_versions)
+            if version != self.current[0]:
+                self.cache.clear()
+            self.current = (version, models)
+            self.loaded[version] = models
+            self.loaded.move_to_end(version)
+            while len(self.loaded) > self.keep_loaded:
+                self.loaded.popitem(last=False)
+        return version
+
+    # Defaults to the version before the current one
+    def rollback(self, version=None):
+        if version is None:
+            older = [v for v in (self.registry.versions() if self.registry is not None else list(self.loaded)) if v < (self.current[0] or 0)]
+            if not older:
+                raise LookupError("No earlier model version")
+            version = older[-1]
+        if version not in self.loaded and (self.registry is None or version not in self.registry.versions()):
+            raise LookupError(f"Unknown model version {version}")
+        if self.registry is not None:
+            self.registry.set_current(version)
+            self.seen_version = version
+        self.activate(version)
+        return version
 
     def run(self):
         self.setup_routes()
+        self.start()
         self.app.run(host='0.0.0.0', port=5000)
 
+    def close(self):
+        self.stop_event.set()
+        if self.watcher is not None:
+            self.watcher.join()
+        if self.coalescer.thread.is_alive():
+            self.coalescer.stop()
+
+def run_server():
+    api_manager = APIManager(ModelRegistry(MODEL_DIR), warm=False)
+    api_manager.setup_routes()
+    serving.serve(api_manager.app, SERVE_BIND, post_fork=api_manager.start)
+
 class TravelDataOrchestrator:
     def __init__(self):
+        # One shared pool so every scraper benefits from the proxy health stats
+        self.proxy_manager = ProxyManager(probe_url=PROXY_PROBE_URL).start_probing()
+        self.http_cache = HTTPCache()
         self.scrapers = {
-            'expedia': ExpediaScraper(),
-            'booking': BookingScraper(),
-            'airbnb': AirbnbScraper(),
+            'expedia': ExpediaScraper(proxy_manager=self.proxy_manager, cache=self.http_cache),
+            'booking': BookingScraper(proxy_manager=self.proxy_manager, cache=self.http_cache),
+            'airbnb': AirbnbScraper(proxy_manager=self.proxy_manager, cache=self.http_cache),
         }
-        self.data_processor = DataProcessor()
-        self.ml_pipeline = MachineLearningPipeline()
+        self.scrape_engine = ScrapeEngine(self.scrapers)
+        self.price_history = PriceHistoryStore(PRICE_HISTORY_DIR)
+        self.data_processor = DataProcessor(incremental=True, state_path=PROCESSOR_STATE_PATH, price_history=self.price_history)
+        self.ml_pipeline = MachineLearningPipeline(self.price_history, incremental=True, weights_path=LSTM_WEIGHTS_PATH, parallel=True)
         self.database = Database()
-        self.api_manager = APIManager()
+        self.model_registry = ModelRegistry(MODEL_DIR)
 
+    # Chunks are stored as they stream in; only a bounded uniform sample of
+    # the cycle is kept in memory for retraining
     def run(self):
         while True:
-            raw_data = self.collect_data()
-            processed_data = self.data_processor.process(raw_data)
-            self.database.store(processed_data)
-            self.ml_pipeline.train(processed_data)
-            self.api_manager.update_models(self.ml_pipeline.get_models())
+            sample = StreamSample(TRAIN_SAMPLE_ROWS)
+            for chunk, errors in self.data_processor.process_stream(self.scrape_engine.stream()):
+                for error in errors:
+                    print(f"Rejected {error['name']} ({error['source']}): {', '.join(error['errors'])}")
+                self.database.store(chunk)
+                sample.add(chunk)
+            if not len(sample):
+                time.sleep(SCRAPE_INTERVAL)
+                continue
+            self.price_history.save()
+            self.ml_pipeline.train(sample.frame())
+            self.model_registry.publish(self.ml_pipeline.get_models())
             time.sleep(SCRAPE_INTERVAL)
 
     def collect_data(self):
-        all_data = []
-        for name, scraper in self.scrapers.items():
-            try:
-                data = scraper.scrape()
-                all_data.extend(data)
-            except Exception as e:
-                print(f"Error scraping {name}: {str(e)}")
-        return all_data
+        return self.scrape_engine.collect()
+
+# Benchmarking
+def synthetic_hotel_html(num_hotels, page=0):
+    cards = []
+    for i in range(num_hotels):
+        amenities = "".join(f'<li class="amenity">Amenity {j}</li>' for j in range(i % 5 + 1))
+        cards.append(
+            f'<div class="hotel-info"><h3 class="hotel-name"> Hotel {page}-{i} </h3>'
+            f'<span class="price">${100 + (page * 37 + i * 13) % 400}</span>'
+            f'<span class="rating">{(page + i) % 5 + 0.5}</span>'
+            f'<ul>{amenities}</ul></div>'
+        )
+    return f'<html><body><div class="results">{"".join(cards)}</div></body></html>'
+
+class FakeTravelSite:
+    # Local HTTP stand-in for the travel sites. Serves synthetic hotel pages
+    # at /hotels/<page>, with optional per-request latency and a number of
+    # initial requests that fail with 503.
+    def __init__(self, hotels_per_page=20, latency=0.0, fail_first=0, etags=True):
+        self.hotels_per_page = hotels_per_page
+        self.latency = latency
+        self.fail_first = fail_first
+        self.etags = etags
+        self.version = 0  # bump to change every page's content
+        self.requests = 0
+        self.lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with site.lock:
+                    site.requests += 1
+                    failing = site.requests <= site.fail_first
+                if site.latency:
+                    time.sleep(site.latency)
+                if failing:
+                    self.respond(503, b"unavailable")
+                    return
+                page = int(self.path.rstrip('/').rsplit('/', 1)[-1] or 0)
+                body = (synthetic_hotel_html(site.hotels_per_page, page) + f"<!-- v{site.version} -->").encode()
+                etag = f'"{hashlib.md5(body).hexdigest()}"' if site.etags else None
+                if etag and self.headers.get("If-None-Match") == etag:
+                    self.respond(304, b"", etag)
+                else:
+                    self.respond(200, body, etag)
+
+            def respond(self, status, body, etag=None):
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html")
+                if etag:
+                    self.send_header("ETag", etag)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+
+    def url(self, path=""):
+        return f"http://127.0.0.1:{self.server.server_port}/{path.lstrip('/')}"
+
+    def page_urls(self, num_pages):
+        return [self.url(f"hotels/{page}") for page in range(num_pages)]
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def benchmark_scraping(num_pages=100, latency=0.05, max_workers=SCRAPE_WORKERS):
+    results = {}
+    with FakeTravelSite(latency=latency) as site:
+        urls = site.page_urls(num_pages)
+
+        scraper = ExpediaScraper(start_urls=urls, proxy_manager=ProxyManager([]))
+        start = time.perf_counter()
+        scraper.scrape()
+        results['sequential'] = num_pages / (time.perf_counter() - start)
+
+        scrapers = {
+            f'expedia-{i}': ExpediaScraper(start_urls=urls[i::4], proxy_manager=ProxyManager([]))
+            for i in range(4)
+        }
+        engine = ScrapeEngine(scrapers, max_workers=max_workers)
+        engine.collect()
+        results['concurrent'] = engine.stats['pages_per_sec']
+
+    for mode, pages_per_sec in results.items():
+        print(f"{mode:>10}: {pages_per_sec:.1f} pages/sec")
+    return results
+
+def benchmark_parsing(num_pages=20, hotels_per_page=200):
+    fixtures = [synthetic_hotel_html(hotels_per_page, page) for page in range(num_pages)]
+    results = {}
+    for backend in ('html.parser', 'lxml'):
+        extractor = HTMLExtractor(ExpediaScraper.selectors, backend)
+        start = time.perf_counter()
+        records = sum(len(extractor.extract(html)) for html in fixtures)
+        elapsed = time.perf_counter() - start
+        results[backend] = {'pages_per_sec': num_pages / elapsed, 'records_per_sec': records / elapsed}
+        print(f"{backend:>11}: {results[backend]['pages_per_sec']:.1f} pages/sec, "
+              f"{results[backend]['records_per_sec']:.0f} records/sec")
+    return results
+
+def benchmark_database(client=None, num_rows=50000):
+    database = Database(client)
+    database.db['hotels'].delete_many({})
+    data = pd.DataFrame({
+        "name": [f"Hotel {i}" for i in range(num_rows)],
+        "price": np.random.rand(num_rows),
+        "rating": np.random.rand(num_rows),
+        "amenities_count": np.random.randint(0, 10, num_rows),
+        "source": np.random.choice(SOURCES, num_rows),
+    })
+    results = {}
+    start = time.perf_counter()
+    database.store(data)
+    results['write_rows_per_sec'] = num_rows / (time.perf_counter() - start)
+    start = time.perf_counter()
+    database.store(data)
+    results['upsert_rows_per_sec'] = num_rows / (time.perf_counter() - start)
+    start = time.perf_counter()
+    rows = sum(len(chunk) for chunk in database.retrieve_chunks(projection={'_id': 0, 'name': 1, 'price': 1}))
+    results['read_rows_per_sec'] = rows / (time.perf_counter() - start)
+    for name, value in results.items():
+        print(f"{name:>20}: {value:.0f}")
+    return results
+
+def synthetic_features(num_rows, num_features=8, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(num_rows, num_features))
+    data = pd.DataFrame(X, columns=[f"feature_{i}" for i in range(num_features)])
+    data['price'] = X @ rng.normal(size=num_features) + rng.normal(0.0, 0.1, num_rows)
+    return data
+
+# Raw scraper-shaped records with a share of duplicate and invalid rows
+def synthetic_hotel_records(num_rows, seed=0, duplicate_rate=0.1, invalid_rate=0.02):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(num_rows)
+    duplicates = rng.random(num_rows) < duplicate_rate
+    ids[duplicates] = rng.integers(0, num_rows, duplicates.sum())
+    prices = rng.uniform(50, 500, num_rows)
+    prices[rng.random(num_rows) < invalid_rate] *= -1
+    return [
+        {
+            "name": f"Hotel {i}",
+            "price": f"${price:.2f}",
+            "rating": f"{rating:.1f}",
+            "amenities": ["wifi", "pool", "gym"][:amenities],
+            "source": SOURCES[i % len(SOURCES)],
+        }
+        for i, price, rating, amenities in zip(ids, prices, rng.uniform(0, 5, num_rows), rng.integers(0, 4, num_rows))
+    ]
+
+def benchmark_processing(num_rows=200000, chunk_size=CHUNK_SIZE):
+    records = synthetic_hotel_records(num_rows)
+    results = {}
+    start = time.perf_counter()
+    for _ in DataProcessor(incremental=True).process_stream(records, chunk_size=chunk_size):
+        pass
+    results['stream'] = num_rows / (time.perf_counter() - start)
+    valid = [record for record in {(r['name'], r['source']): r for r in records}.values() if not record['price'].startswith("$-")]
+    start = time.perf_counter()
+    DataProcessor().process(valid)
+    results['batch'] = len(valid) / (time.perf_counter() - start)
+    for mode, rows_per_sec in results.items():
+        print(f"{mode:>7}: {rows_per_sec:.0f} rows/sec")
+    return results
+
+def benchmark_ensemble(num_rows=20000, dl_epochs=3, request_rows=1, num_requests=100):
+    data = synthetic_features(num_rows)
+    requests_data = [data.iloc[i:i + request_rows] for i in range(num_requests)]
+    results = {}
+    for mode, parallel in (("sequential", False), ("parallel", True)):
+        model = EnsembleModel(dl_epochs=dl_epochs, parallel=parallel)
+        if parallel:
+            # Start the worker processes outside the timed region
+            model.processes().submit(int).result()
+        start = time.perf_counter()
+        model.train(data)
+        results[f'{mode}_train_sec'] = time.perf_counter() - start
+        latencies = []
+        for features in requests_data:
+            start = time.perf_counter()
+            model.predict(features)
+            latencies.append(time.perf_counter() - start)
+        results[f'{mode}_predict_p50_ms'] = np.percentile(latencies, 50) * 1000
+        results[f'{mode}_predict_p99_ms'] = np.percentile(latencies, 99) * 1000
+        model.close()
+    for name, value in results.items():
+        print(f"{name:>26}: {value:.2f}")
+    return results
+
+# Load test of the prediction API over real HTTP. Rows are drawn from a
+# pool of num_distinct hotels, so repeated hotels exercise the cache.
+def benchmark_api(num_requests=2000, concurrency=16, batch_size=100, num_distinct=500, dl_epochs=1):
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    data = synthetic_features(5000)
+    model = EnsembleModel(dl_epochs=dl_epochs)
+    model.train(data)
+    model.warm_up()
+    rows = data.drop(columns='price').iloc[:num_distinct].to_dict('records')
+    results = {}
+
+    start = time.perf_counter()
+    for row in rows[:200]:
+        model.predict(pd.DataFrame([row]))
+    results['dataframe_row_ms'] = (time.perf_counter() - start) / 200 * 1000
+    start = time.perf_counter()
+    for row in rows[:200]:
+        model.predict_records([row])
+    results['assembled_row_ms'] = (time.perf_counter() - start) / 200 * 1000
+
+    api = APIManager()
+    api.setup_routes()
+    api.update_models({'price_predictor': model, 'recommendation_engine': RecommendationModel()})
+    api.start()
+    server = make_server('127.0.0.1', 0, api.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_port}"
+    token = jwt.encode({'user': 'benchmark'}, SECRET_KEY, algorithm="HS256")
+    local = threading.local()
+
+    def call(path, payload):
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        local.session.post(f"{base}{path}?token={token}", json=payload).raise_for_status()
+        return time.perf_counter() - start
+
+    def run(name, path, payloads, hotels_per_call):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = np.array(list(pool.map(lambda payload: call(path, payload), payloads))) * 1000
+        elapsed = time.perf_counter() - start
+        results[f'{name}_req_per_sec'] = len(payloads) / elapsed
+        results[f'{name}_hotels_per_sec'] = len(payloads) * hotels_per_call / elapsed
+        results[f'{name}_p50_ms'] = np.percentile(latencies, 50)
+        results[f'{name}_p99_ms'] = np.percentile(latencies, 99)
+
+    try:
+        run('single', '/predict', [random.choice(rows) for _ in range(num_requests)], 1)
+        run('batch', '/predict/batch', [{'hotels': random.sample(rows, batch_size)} for _ in range(num_requests // batch_size or 1)], batch_size)
+        results['cache_hit_rate'] = api.cache.stats()['hit_rate']
+        results['mean_coalesced_batch'] = api.coalescer.stats()['mean_batch_size']
+    finally:
+        server.shutdown()
+        api.close()
+    for name, value in results.items():
+        print(f"{name:>26}: {value:.2f}")
+    return results
 
 if __name__ == "__main__":
-    orchestrator = TravelDataOrchestrator()
-    api_thread = threading.Thread(target=orchestrator.api_manager.run)
-    api_thread.start()
-    orchestrator.run()
\ No newline at end of file
+    # `serve` runs only the API; otherwise training runs here and the API in
+    # its own process, so a retrain can't starve request handling
+    if sys.argv[1:] == ["serve"]:
+        run_server()
+        sys.exit(0)
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve"])
+    try:
+        orchestrator = TravelDataOrchestrator()
+        orchestrator.run()
+    finally:
+        server.terminate()
+
+import unittest
+import tempfile
+from unittest.mock import patch
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+class TestScrapeEngine(unittest.TestCase):
+    def setUp(self):
+        self.site = FakeTravelSite(hotels_per_page=5).start()
+
+    def tearDown(self):
+        self.site.stop()
+
+    def test_engine_streams_all_pages(self):
+        scrapers = {
+            'expedia': ExpediaScraper(start_urls=self.site.page_urls(6), proxy_manager=ProxyManager([])),
+            'booking': BookingScraper(start_urls=[self.site.url('hotels/0')], proxy_manager=ProxyManager([])),
+        }
+        engine = ScrapeEngine(scrapers, max_workers=4, per_source=2)
+        records = list(engine.stream())
+        self.assertEqual(len(records), 30)
+        self.assertEqual(len({record['name'] for record in records}), 30)
+        self.assertEqual(engine.stats['pages'], 7)
+        self.assertEqual(engine.stats['failures'], 0)
+
+    def test_slow_source_does_not_hold_back_the_others(self):
+        with FakeTravelSite(hotels_per_page=5, latency=0.3) as slow:
+            fast = ExpediaScraper(start_urls=self.site.page_urls(4), proxy_manager=ProxyManager([]))
+            finished = []
+            fetch = fast.fetch
+            fast.fetch = lambda url: (fetch(url), finished.append(time.perf_counter()))[0]
+            scrapers = {'slow': ExpediaScraper(start_urls=slow.page_urls(20), proxy_manager=ProxyManager([])), 'fast': fast}
+            engine = ScrapeEngine(scrapers, max_workers=4, per_source=2)
+            start = time.perf_counter()
+            self.assertEqual(len(engine.collect()), 24 * 5)
+            self.assertEqual(len(finished), 4)
+            # The slow source needs ten rounds of 0.3s; the fast one must not wait for them
+            self.assertLess(max(finished) - start, 1.0)
+            self.assertGreater(engine.stats['seconds'], 2.5)
+
+    def test_get_retries_with_backoff(self):
+        self.site.fail_first = 2
+        scraper = ExpediaScraper(start_urls=[self.site.url('hotels/1')], proxy_manager=ProxyManager([]))
+        with patch('time.sleep') as sleep:
+            self.assertEqual(len(scraper.scrape()), 5)
+        self.assertEqual(sleep.call_count, 2)
+
+    def test_get_gives_up_after_retry_cap(self):
+        self.site.fail_first = 100
+        scraper = ExpediaScraper(proxy_manager=ProxyManager([]), max_retries=3)
+        with patch('time.sleep'):
+            with self.assertRaises(requests.HTTPError):
+                scraper.get(self.site.url('hotels/0'))
+        self.assertEqual(self.site.requests, 4)
+
+class TestProxyManager(unittest.TestCase):
+    def setUp(self):
+        self.fast = FakeTravelSite(hotels_per_page=2).start()
+        self.slow = FakeTravelSite(hotels_per_page=2, latency=0.03).start()
+        self.broken = FakeTravelSite(hotels_per_page=2, fail_first=10 ** 6).start()
+
+    def tearDown(self):
+        for site in (self.fast, self.slow, self.broken):
+            site.stop()
+
+    def test_failing_proxy_trips_breaker(self):
+        manager = ProxyManager([self.fast.url(), self.broken.url(), "http://127.0.0.1:1"], failure_threshold=2, cooldown=60)
+        scraper = ExpediaScraper(proxy_manager=manager, max_retries=10)
+        with patch('time.sleep'):
+            for page in range(200):
+                self.assertEqual(len(scraper.parse(scraper.get(f"http://hotels.test/hotels/{page}").text)), 2)
+                stats = manager.stats()
+                if stats[self.broken.url()]['state'] == stats["http://127.0.0.1:1"]['state'] == 'open':
+                    break
+        self.assertEqual(stats[self.broken.url()]['state'], 'open')
+        self.assertEqual(stats["http://127.0.0.1:1"]['state'], 'open')
+        self.assertEqual(stats[self.fast.url()]['state'], 'closed')
+        self.assertTrue(all(manager.get_proxy()['http'] == self.fast.url() for _ in range(20)))
+
+    def test_routes_by_latency_score(self):
+        manager = ProxyManager([self.fast.url(), self.slow.url()], smoothing=0.5)
+        scraper = ExpediaScraper(proxy_manager=manager)
+        for page in range(30):
+            scraper.get(f"http://hotels.test/hotels/{page}")
+        stats = manager.stats()
+        self.assertGreater(stats[self.fast.url()]['score'], stats[self.slow.url()]['score'])
+        self.assertGreater(stats[self.fast.url()]['requests'], stats[self.slow.url()]['requests'])
+
+    def test_all_open_breakers_back_off_unless_direct_is_allowed(self):
+        manager = ProxyManager([self.broken.url(), "http://127.0.0.1:1"], failure_threshold=1, cooldown=60)
+        for url in manager.proxies:
+            manager.record({"http": url, "https": url}, 0.01, ok=False)
+        self.assertRaises(NoProxyAvailable, manager.get_proxy)
+        scraper = ExpediaScraper(proxy_manager=manager, max_retries=2)
+        with patch('time.sleep') as sleep:
+            with self.assertRaises(NoProxyAvailable):
+                scraper.get(self.fast.url('hotels/0'))
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(self.fast.requests, 0)
+        manager.allow_direct = True
+        self.assertIsNone(manager.get_proxy())
+        manager.cooldown = 0
+        self.assertIn(manager.get_proxy()['http'], manager.proxies)
+
+    def test_probe_closes_recovered_proxy(self):
+        flaky = FakeTravelSite(fail_first=2).start()
+        try:
+            manager = ProxyManager([flaky.url()], failure_threshold=2, cooldown=0, probe_url="http://hotels.test/hotels/0")
+            proxies = manager.get_proxy()
+            manager.record(proxies, 0.01, ok=False)
+            manager.record(proxies, 0.01, ok=False)
+            self.assertEqual(manager.stats()[flaky.url()]['state'], 'open')
+            flaky.requests = 2
+            manager.probe()
+            self.assertEqual(manager.stats()[flaky.url()]['state'], 'closed')
+        finally:
+            flaky.stop()
+
+class TestHTTPCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_conditional_get_skips_unchanged_pages(self):
+        with FakeTravelSite(hotels_per_page=3) as site:
+            cache = HTTPCache(self.directory)
+            scraper = ExpediaScraper(start_urls=site.page_urls(4), proxy_manager=ProxyManager([]), cache=cache)
+            self.assertEqual(len(scraper.scrape()), 12)
+            self.assertEqual(scraper.scrape(), [])
+            self.assertEqual(cache.stats()['not_modified'], 4)
+            site.version += 1
+            self.assertEqual(len(scraper.scrape()), 12)
+            self.assertAlmostEqual(cache.stats()['hit_rate'], 4 / 12)
+
+    def test_content_hash_dedup_without_validators(self):
+        with FakeTravelSite(hotels_per_page=3, etags=False) as site:
+            cache = HTTPCache(self.directory)
+            scraper = ExpediaScraper(start_urls=site.page_urls(2), proxy_manager=ProxyManager([]), cache=cache)
+            scraper.scrape()
+            self.assertEqual(scraper.scrape(), [])
+            self.assertEqual(cache.stats()['hits'], 2)
+            self.assertEqual(cache.stats()['not_modified'], 0)
+
+    def test_size_bounded_eviction_and_persistence(self):
+        with FakeTravelSite(hotels_per_page=3) as site:
+            cache = HTTPCache(self.directory, max_bytes=1500)
+            scraper = ExpediaScraper(start_urls=site.page_urls(5), proxy_manager=ProxyManager([]), cache=cache)
+            scraper.scrape()
+            stats = cache.stats()
+            self.assertLessEqual(stats['bytes'], 1500)
+            self.assertLess(stats['entries'], 5)
+            self.assertEqual(stats['bytes'], sum(entry['size'] for entry in cache.index.values()))
+            self.assertEqual(HTTPCache(self.directory).index.keys(), cache.index.keys())
+
+    def test_index_is_written_in_batches(self):
+        with FakeTravelSite(hotels_per_page=3) as site:
+            cache = HTTPCache(self.directory, flush_every=3)
+            scraper = ExpediaScraper(proxy_manager=ProxyManager([]), cache=cache)
+            for url in site.page_urls(4):
+                scraper.fetch(url)
+            self.assertEqual(len(HTTPCache(self.directory).index), 3)
+            engine = ScrapeEngine({'expedia': ExpediaScraper(start_urls=site.page_urls(5), proxy_manager=ProxyManager([]), cache=cache)})
+            engine.collect()
+            self.assertEqual(cache.pending, 0)
+            self.assertEqual(len(HTTPCache(self.directory).index), 5)
+
+class TestHTMLExtractor(unittest.TestCase):
+    def test_backends_agree(self):
+        html = synthetic_hotel_html(50, page=3)
+        soup_records = HTMLExtractor(ExpediaScraper.selectors, 'html.parser').extract(html)
+        lxml_records = HTMLExtractor(ExpediaScraper.selectors, 'lxml', chunk_size=512).extract(html)
+        self.assertEqual(len(soup_records), 50)
+        self.assertEqual(soup_records, lxml_records)
+        self.assertEqual(lxml_records[0]["name"], "Hotel 3-0")
+        self.assertEqual(lxml_records[1]["amenities"], ["Amenity 0", "Amenity 1"])
+        self.assertEqual(lxml_records[0]["source"], "Expedia")
+
+    def test_selectors_match_whole_class_names(self):
+        selectors = CardSelectors(card=('div', 'card'), fields={"title": ('b', 'title')})
+        html = ('<div class="card featured"><b class="title x">A</b></div>'
+                '<div class="cardboard"><b class="title">B</b></div>')
+        self.assertEqual(HTMLExtractor(selectors, 'lxml').extract(html), [{"title": "A"}])
+
+class TestDataProcessor(unittest.TestCase):
+    def records(self, start, count, source="Expedia"):
+        return [{
+            "name": f"Hotel {i}",
+            "price": f"${100 + 10 * i:,}",
+            "rating": str(i % 5),
+            "amenities": ["Wifi"] * (i % 3),
+            "source": source,
+        } for i in range(start, start + count)]
+
+    def test_incremental_scaling_matches_full_history(self):
+        processor = DataProcessor(incremental=True)
+        processor.process(self.records(0, 50))
+        second = processor.process(self.records(50, 50, source="Booking"))
+        self.assertEqual([c for c in second.columns if c.startswith('source_')],
+                         ['source_Expedia', 'source_Booking', 'source_Airbnb'])
+        self.assertTrue(second['source_Booking'].all())
+        with self.assertRaises(ValueError):
+            processor.process(self.records(100, 5, source="Hostelworld"))
+        self.assertEqual(processor.scaler.n_samples_seen_, 100)
+
+        full = DataProcessor().parse(pd.DataFrame(self.records(0, 50) + self.records(50, 50, source="Booking")))
+        np.testing.assert_allclose(processor.scaler.mean_, full[NUMERIC_COLUMNS].mean().values)
+        expected = (full[NUMERIC_COLUMNS].values[50:] - processor.scaler.mean_) / processor.scaler.scale_
+        np.testing.assert_allclose(second[NUMERIC_COLUMNS].values, expected)
+
+    def test_state_is_persisted(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, "state.pkl")
+            DataProcessor(incremental=True, state_path=path).process(self.records(0, 40))
+            restored = DataProcessor(incremental=True, state_path=path)
+            self.assertEqual(restored.scaler.n_samples_seen_, 40)
+            self.assertEqual(restored.sources, SOURCES)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_vectorized_parsing(self):
+        df = DataProcessor().parse(pd.DataFrame(self.records(98, 3)))
+        self.assertEqual(df['price'].tolist(), [1080.0, 1090.0, 1100.0])
+        self.assertEqual(df['amenities_count'].tolist(), [2, 0, 1])
+
+    def test_stream_dedups_across_chunks_and_reports_bad_rows(self):
+        records = self.records(0, 30) + self.records(10, 30) + self.records(0, 5, source="Airbnb")
+        records += self.records(7, 1, source="Hostelworld")
+        records[3]["price"] = "-$5"
+        records[4]["rating"] = "9"
+        processor = DataProcessor(incremental=True)
+        results = list(processor.process_stream(iter(records), chunk_size=7))
+        self.assertEqual(len(results), 10)
+        rows = pd.concat([chunk for chunk, _ in results])
+        errors = [error for _, chunk_errors in results for error in chunk_errors]
+        self.assertEqual(len(rows), 40 + 5 - 2)
+        self.assertEqual(int(rows['source_Airbnb'].sum()), 5)
+        self.assertEqual(sorted((e["name"], e["errors"][0]) for e in errors),
+                         [("Hotel 3", "Negative or missing price"), ("Hotel 4", "Invalid rating"), ("Hotel 7", "Unknown source")])
+
+    def test_stream_columns_and_scale_do_not_depend_on_chunk_size(self):
+        records = self.records(0, 30) + self.records(30, 10, source="Airbnb")
+        scalers = []
+        for chunk_size in (7, 100):
+            processor = DataProcessor()
+            chunks = [chunk for chunk, _ in processor.process_stream(iter(records), chunk_size=chunk_size)]
+            self.assertTrue(all(list(chunk.columns) == list(chunks[0].columns) for chunk in chunks))
+            self.assertEqual([c for c in chunks[0].columns if c.startswith('source_')],
+                             ['source_Expedia', 'source_Booking', 'source_Airbnb'])
+            scalers.append((processor.scaler.mean_, processor.scaler.scale_))
+        np.testing.assert_allclose(scalers[0][0], scalers[1][0])
+        np.testing.assert_allclose(scalers[0][1], scalers[1][1])
+
+    def test_stream_sample_is_bounded_and_covers_every_chunk(self):
+        sample = StreamSample(max_rows=150, seed=0)
+        for start in range(0, 1000, 100):
+            sample.add(pd.DataFrame({'row': np.arange(start, start + 100)}, index=np.arange(start, start + 100)))
+        rows = sample.frame()['row'].values
+        self.assertEqual((len(sample), sample.seen), (150, 1000))
+        self.assertEqual(len(set(rows)), 150)
+        self.assertEqual(len(set(rows // 100)), 10)
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, error_rate=0.01)
+        keys = np.random.randint(0, 2 ** 63, size=(2, 1000), dtype=np.int64).astype(np.uint64)
+        bloom.add(keys[0, :500], keys[1, :500])
+        self.assertTrue(bloom.contains(keys[0, :500], keys[1, :500]).all())
+        self.assertLess(bloom.contains(keys[0, 500:], keys[1, 500:]).mean(), 0.05)
+
+@unittest.skipIf(mongomock is None, "mongomock is not installed")
+class TestDatabase(unittest.TestCase):
+    def setUp(self):
+        self.database = Database(mongomock.MongoClient(), write_batch_size=7)
+
+    def frame(self, count, price=1.0):
+        return pd.DataFrame({
+            "name": [f"Hotel {i}" for i in range(count)],
+            "price": [price] * count,
+            "source_Expedia": [i % 2 == 0 for i in range(count)],
+            "source_Booking": [i % 2 == 1 for i in range(count)],
+        })
+
+    def test_store_is_idempotent_upsert(self):
+        self.database.store(self.frame(20))
+        self.database.store(self.frame(20, price=2.0))
+        collection = self.database.db['hotels']
+        self.assertEqual(collection.count_documents({}), 20)
+        self.assertEqual(collection.count_documents({'price': 2.0}), 20)
+        self.assertEqual(collection.count_documents({'source': 'Booking'}), 10)
+
+    def test_legacy_documents_are_migrated_before_indexing(self):
+        client = mongomock.MongoClient()
+        legacy = client[DB_NAME]['hotels']
+        for cycle in range(3):
+            legacy.insert_many([
+                {'name': f"Hotel {i}", 'price': float(cycle), 'source_Expedia': i % 2 == 0, 'source_Booking': i % 2 == 1}
+                for i in range(4)
+            ])
+        database = Database(client, write_batch_size=2)
+        self.assertEqual(legacy.count_documents({}), 4)
+        self.assertEqual(legacy.count_documents({'price': 2.0}), 4)
+        self.assertEqual(legacy.count_documents({'source': 'Booking'}), 2)
+        self.assertIn([('name', 1), ('source', 1)], [index['key'] for index in legacy.index_information().values()])
+        # Later upserts now find the migrated documents
+        database.store(self.frame(4, price=5.0))
+        self.assertEqual(legacy.count_documents({}), 4)
+        self.assertEqual(legacy.count_documents({'price': 5.0}), 4)
+
+    def test_rows_without_a_source_are_rejected(self):
+        frame = self.frame(4)
+        frame.loc[1, 'source_Booking'] = False
+        with self.assertRaises(ValueError):
+            self.database.store(frame)
+        self.assertEqual(self.database.db['hotels'].count_documents({}), 0)
+
+    def test_streaming_retrieval_with_projection(self):
+        self.database.store(self.frame(25))
+        chunks = list(self.database.retrieve_chunks({'source': 'Expedia'}, {'_id': 0, 'name': 1}, chunk_size=5))
+        self.assertEqual([len(chunk) for chunk in chunks], [5, 5, 3])
+        self.assertEqual(list(chunks[0].columns), ['name'])
+        self.assertEqual(len(self.database.retrieve({})), 25)
+
+class TestPriceHistoryStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def fill(self, store, days=5):
+        hours = np.arange(days * 24) * 3600
+        for hotel, base in (("A", 100.0), ("B", 200.0)):
+            store.append_many([hotel] * len(hours), hours[::-1], base + hours[::-1] // 86400)
+
+    def test_partitions_and_rollup(self):
+        store = PriceHistoryStore(self.directory)
+        self.fill(store)
+        self.assertEqual(len(store), 240)
+        store.flush()
+        self.assertEqual(sorted(store.partitions), [0, 1, 2, 3, 4])
+        timestamps, prices = store.history("A", start=86400, end=2 * 86400)
+        self.assertEqual(len(timestamps), 24)
+        self.assertTrue(np.all(np.diff(timestamps) > 0))
+        daily = store.rollup(86400)
+        self.assertEqual(len(daily), 10)
+        self.assertEqual(daily[daily['hotel'] == "B"]['price'].tolist(), [200.0, 201.0, 202.0, 203.0, 204.0])
+
+    def test_windows_and_persistence(self):
+        store = PriceHistoryStore(self.directory)
+        self.fill(store)
+        store.save()
+        restored = PriceHistoryStore(self.directory)
+        X, y = restored.windows(3, freq_seconds=86400)
+        self.assertEqual(X.shape, (4, 3, 1))
+        np.testing.assert_array_equal(X[0, :, 0], [100.0, 101.0, 102.0])
+        self.assertEqual(y[0], 103.0)
+        X, y = restored.windows(24)
+        self.assertEqual(X.shape, (2 * (120 - 24), 24, 1))
+
+    def test_counts_without_loading_and_evicts_cold_partitions(self):
+        store = PriceHistoryStore(self.directory, max_cached=2)
+        self.fill(store)
+        store.save()
+        self.assertEqual(sum(current is not None for current in store.partitions.values()), 2)
+        self.assertFalse([f for f in os.listdir(self.directory) if f.endswith(".tmp")])
+        restored = PriceHistoryStore(self.directory, max_cached=2)
+        self.assertEqual(len(restored), 240)
+        self.assertTrue(all(current is None for current in restored.partitions.values()))
+        restored.append("C", 5 * 86400, 300.0)
+        self.assertEqual(len(restored), 241)
+        timestamps, _ = restored.history("A")
+        self.assertEqual(len(timestamps), 120)
+        self.assertEqual(sum(current is not None for current in restored.partitions.values()), 2)
+        with open(os.path.join(self.directory, "hotels.json")) as f:
+            self.assertEqual(json.load(f), ["A", "B", "C"])
+
+    def test_forecaster_trains_on_recent_periods_only(self):
+        store = PriceHistoryStore()
+        now = int(time.time()) // 86400 * 86400
+        days = np.arange(-400, 0) * 86400 + now
+        store.append_many(["A"] * len(days), days, np.arange(len(days), dtype=np.float32))
+        with patch.object(store, 'windows', wraps=store.windows) as windows:
+            model = DeepLearningModel()
+            model.train_on_history(store, window=3, periods=30, epochs=1)
+        start = windows.call_args.kwargs['start']
+        self.assertEqual(start, (int(time.time()) // 86400 - 30) * 86400)
+        X, _ = store.windows(3, freq_seconds=86400, start=start)
+        self.assertEqual(len(X), 30 - 3)
+
+class TestEnsembleModel(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def batch(self, n=1000, shift=0.0, seed=0):
+        rng = np.random.default_rng(seed)
+        rating = rng.normal(shift, 1.0, n)
+        return pd.DataFrame({
+            'name': [f"Hotel {i}" for i in range(n)],
+            'amenities': [["wifi"]] * n,
+            'rating': rating,
+            'amenities_count': rng.normal(0.0, 1.0, n),
+            'source_Expedia': rng.random(n) < 0.5,
+            'price': 2.0 * rating + rng.normal(0.0, 0.1, n),
+        })
+
+    def test_incremental_retrain_warm_starts_and_skips_without_drift(self):
+        weights_path = os.path.join(self.directory, "lstm.weights.h5")
+        model = EnsembleModel(incremental=True, weights_path=weights_path, drift_threshold=0.2, trees_per_update=5,
+                              dl_epochs=1, dl_update_epochs=1)
+        self.assertTrue(model.train(self.batch()))
+        self.assertEqual(set(model.training_times), {'rf', 'gb', 'dl'})
+        self.assertTrue(os.path.exists(weights_path))
+        self.assertEqual(len(model.rf_model.estimators_), 100)
+
+        self.assertFalse(model.train(self.batch(seed=1)))
+        self.assertEqual(len(model.rf_model.estimators_), 100)
+
+        self.assertTrue(model.train(self.batch(shift=1.0, seed=2)))
+        self.assertEqual(len(model.rf_model.estimators_), 105)
+        self.assertEqual(len(model.gb_model.estimators_), 105)
+        self.assertEqual(model.predict(self.batch(n=3)).shape, (3,))
+
+        restored = EnsembleModel(incremental=True, weights_path=weights_path, drift_threshold=0.2, trees_per_update=5,
+                                 dl_epochs=1, dl_update_epochs=1)
+        np.testing.assert_allclose(restored.dl_model.model.get_weights()[0], model.dl_model.model.get_weights()[0])
+        self.assertEqual(len(restored.rf_model.estimators_), 105)
+        np.testing.assert_allclose(restored.predict(self.batch(n=3)), model.predict(self.batch(n=3)), rtol=1e-5)
+        # The restart continues where the last process stopped: no drift, no retrain
+        self.assertFalse(restored.train(self.batch(shift=1.0, seed=3)))
+        self.assertTrue(restored.train(self.batch(shift=2.0, seed=4)))
+        self.assertEqual(len(restored.rf_model.estimators_), 110)
+
+    def test_incremental_retrain_stays_under_max_estimators(self):
+        model = EnsembleModel(incremental=True, drift_threshold=0.2, trees_per_update=5, max_estimators=110,
+                              dl_epochs=1, dl_update_epochs=1)
+        self.assertTrue(model.train(self.batch()))
+        oldest = model.rf_model.estimators_[0]
+        for shift in (1.0, 2.0):
+            self.assertTrue(model.train(self.batch(shift=shift, seed=int(shift))))
+        self.assertEqual(len(model.rf_model.estimators_), 110)
+        self.assertEqual(len(model.gb_model.estimators_), 110)
+        self.assertTrue(model.train(self.batch(shift=3.0, seed=3)))
+        self.assertEqual(len(model.rf_model.estimators_), 110)
+        self.assertNotIn(oldest, model.rf_model.estimators_)
+        self.assertEqual(len(model.gb_model.estimators_), 100)
+        self.assertEqual(model.predict(self.batch(n=3)).shape, (3,))
+
+    def test_parallel_training_matches_sequential_members(self):
+        model = EnsembleModel(dl_epochs=1, parallel=True, cores=4)
+        self.assertEqual(model.cores, {'rf': 1, 'gb': 1, 'dl': 2})
+        try:
+            self.assertTrue(model.train(self.batch()))
+            self.assertEqual(set(model.training_times), {'rf', 'gb', 'dl'})
+            self.assertEqual(model.rf_model.n_jobs, 1)
+            self.assertEqual(len(model.gb_model.estimators_), 100)
+            features = self.batch(n=5)
+            parallel = model.predict(features)
+            model.parallel = False
+            np.testing.assert_allclose(model.predict(features), parallel, rtol=1e-5)
+        finally:
+            model.close()
+
+    def test_parallel_mode_limits_tensorflow_threads(self):
+        # Needs a fresh interpreter, TensorFlow is already running in this one
+        script = (
+            "import importlib.util, sys, tensorflow as tf\n"
+            "spec = importlib.util.spec_from_file_location('data_collect', 'data-collect.py')\n"
+            "module = importlib.util.module_from_spec(spec)\n"
+            "spec.loader.exec_module(module)\n"
+            "model = module.EnsembleModel(parallel=True, cores=4)\n"
+            "print(model.tf_threads_limited, tf.config.threading.get_intra_op_parallelism_threads())\n"
+        )
+        output = subprocess.run([sys.executable, "-c", script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, timeout=300).stdout
+        self.assertEqual(output.split()[-2:], ["True", "2"])
+
+    def test_history_forecaster_is_kept_out_of_the_ensemble(self):
+        store = PriceHistoryStore()
+        processor = DataProcessor(incremental=True, price_history=store)
+        data = pd.concat([chunk for chunk, _ in processor.process_stream(synthetic_hotel_records(300), chunk_size=100)])
+        days = np.arange(-HISTORY_WINDOW - 5, 0) * HISTORY_FREQ + int(time.time())
+        for i in range(10):
+            store.append_many([f"Expedia:Hotel {i}"] * len(days), days, 100.0 + 10 * i + np.arange(len(days)))
+        model = EnsembleModel(price_history=store, dl_epochs=1)
+        self.assertTrue(model.train(data))
+        self.assertIn('forecaster', model.training_times)
+        predictions = model.predict(data.head(20))
+        self.assertEqual(predictions.shape, (20,))
+        # Members predict the scaled price, so the average stays on that scale
+        self.assertLess(np.abs(predictions).max(), 10.0)
+        windows, _ = store.windows(HISTORY_WINDOW, freq_seconds=HISTORY_FREQ)
+        self.assertEqual(model.forecast(windows[:3, :, 0]).shape, (3,))
+        model.save(self.directory)
+        restored = EnsembleModel.load(self.directory)
+        np.testing.assert_allclose(restored.forecast(windows[:3, :, 0]), model.forecast(windows[:3, :, 0]), rtol=1e-5)
+        self.assertRaises(LookupError, EnsembleModel(dl_epochs=1).forecast, windows[:1, :, 0])
+
+class TestModelRegistry(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.data = synthetic_features(300, num_features=4)
+        cls.model = EnsembleModel(dl_epochs=1)
+        cls.model.train(cls.data)
+        cls.token = jwt.encode({'user': 'test'}, SECRET_KEY, algorithm="HS256")
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.registry = ModelRegistry(self.directory, keep=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def pipeline(self):
+        return {'price_predictor': self.model, 'recommendation_engine': RecommendationModel()}
+
+    def test_publish_load_and_prune(self):
+        features = self.data.iloc[:5]
+        self.assertEqual([self.registry.publish(self.pipeline()) for _ in range(3)], [1, 2, 3])
+        self.assertEqual(self.registry.versions(), [2, 3])
+        models = self.registry.load()
+        self.assertIsInstance(models['recommendation_engine'], RecommendationModel)
+        np.testing.assert_allclose(models['price_predictor'].predict(features), self.model.predict(features), rtol=1e-5)
+        self.assertFalse(models['price_predictor'].parallel)
+
+    def test_parallel_flag_survives_the_registry(self):
+        self.model.parallel = True
+        try:
+            version = self.registry.publish(self.pipeline())
+        finally:
+            self.model.parallel = False
+        loaded = self.registry.load(version)['price_predictor']
+        self.addCleanup(loaded.close)
+        self.assertTrue(loaded.parallel)
+        np.testing.assert_allclose(loaded.predict(self.data.iloc[:5]), self.model.predict(self.data.iloc[:5]), rtol=1e-5)
+        self.assertIsNotNone(loaded.thread_pool)
+        self.assertFalse(self.registry.load(version, parallel=False)['price_predictor'].parallel)
+
+    def test_api_swaps_and_rolls_back(self):
+        self.registry.publish(self.pipeline())
+        api = APIManager(self.registry)
+        api.setup_routes()
+        api.start()
+        self.addCleanup(api.close)
+        client = api.app.test_client()
+        row = self.data.iloc[0].drop('price').to_dict()
+        self.assertEqual(client.post(f'/predict?token={self.token}', json=row).get_json()['model_version'], 1)
+
+        results = []
+        def hammer():
+            for _ in range(20):
+                response = client.post(f'/predict?token={self.token}', json=row)
+                results.append((response.status_code, response.get_json()['model_version']))
+        thread = threading.Thread(target=hammer)
+        thread.start()
+        self.assertEqual(api.update_models(self.pipeline()), 2)
+        thread.join()
+        self.assertTrue(all(status == 200 and version in (1, 2) for status, version in results))
+        self.assertEqual(api.current[0], 2)
+
+        response = client.post(f'/models/rollback?token={self.token}', json={})
+        self.assertEqual(response.get_json(), {"current": 1})
+        self.assertIs(api.models, api.loaded[1])
+        self.assertEqual(client.post(f'/models/rollback?token={self.token}', json={}).status_code, 404)
+        self.assertEqual(self.registry.current(), 1)
+        self.assertEqual(APIManager(self.registry).current[0], 1)
+
+    def test_batch_endpoint_cache_and_coalescing(self):
+        api = APIManager()
+        api.setup_routes()
+        api.update_models(self.pipeline())
+        api.start()
+        client = api.app.test_client()
+        try:
+            hotels = self.data.drop(columns='price').iloc[:10].to_dict('records')
+            expected = self.model.predict(self.data.iloc[:10])
+            response = client.post(f'/predict/batch?token={self.token}', json={'hotels': hotels})
+            np.testing.assert_allclose(response.get_json()['predicted_prices'], expected, rtol=1e-5)
+            client.post(f'/predict/batch?token={self.token}', json={'hotels': hotels})
+            self.assertEqual(api.cache.stats()['hits'], 10)
+            metrics = client.get('/metrics').get_data(as_text=True)
+            self.assertIn('http_requests_total{method="POST",route="/predict/batch",status="200"}', metrics)
+            self.assertIn('ensemble_train_seconds_count{component="rf"}', metrics)
+
+            futures = [api.coalescer.submit(hotel) for hotel in hotels]
+            predictions = [future.result(timeout=5)[1] for future in futures]
+            np.testing.assert_allclose(predictions, expected, rtol=1e-5)
+            self.assertGreater(api.coalescer.stats()['mean_batch_size'], 1)
+
+            # A new model version must not be served from the old version's cache entries
+            api.swap(7, self.pipeline())
+            api.predict_records(hotels[:1])
+            self.assertEqual(api.cache.stats()['misses'], 11)
+
+            # Without a registry every update still gets a fresh version
+            class ConstantModel:
+                assembler = self.model.assembler
+
+                def predict_array(self, X):
+                    return np.full(len(X), 42.0)
+
+            first = api.update_models(self.pipeline())
+            api.predict_records(hotels[:1])
+            second = api.update_models({'price_predictor': ConstantModel(), 'recommendation_engine': RecommendationModel()})
+            self.assertGreater(second, first)
+            self.assertEqual(api.predict_records(hotels[:1]), (second, [42.0]))
+        finally:
+            api.close()
+
+    def test_lazy_start_ready_and_registry_watch(self):
+        client_api = APIManager(self.registry)
+        client_api.setup_routes()
+        self.assertEqual(client_api.app.test_client().get('/ready').status_code, 503)
+
+        self.registry.publish(self.pipeline())
+        api = APIManager(self.registry, warm=False, poll_interval=0.05)
+        self.assertIsNone(api.models['price_predictor'].dl_model.model)
+        api.setup_routes()
+        client = api.app.test_client()
+        self.assertEqual(client.get('/ready').status_code, 503)
+        api.start()
+        self.addCleanup(api.close)
+        self.assertIsNotNone(api.models['price_predictor'].dl_model.model)
+        self.assertEqual(client.get('/ready').get_json(), {"ready": True, "model_version": 1})
+
+        self.registry.publish(self.pipeline())
+        deadline = time.time() + 10
+        while api.current[0] != 2 and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(api.current[0], 2)
+
+    def wait_for_version(self, api, version):
+        deadline = time.time() + 10
+        while api.current[0] != version and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(api.current[0], version)
+
+    def test_rollback_and_publish_reach_every_worker(self):
+        self.registry.publish(self.pipeline())
+        workers = [APIManager(self.registry, poll_interval=0.05).start() for _ in range(2)]
+        for worker in workers:
+            self.addCleanup(worker.close)
+        self.assertEqual(workers[0].update_models(self.pipeline()), 2)
+        self.wait_for_version(workers[1], 2)
+        self.assertEqual(workers[1].rollback(), 1)
+        self.wait_for_version(workers[0], 1)
+        time.sleep(0.2)
+        self.assertEqual([worker.current[0] for worker in workers], [1, 1])
+        self.assertEqual(self.registry.publish(self.pipeline()), 3)
+        for worker in workers:
+            self.wait_for_version(worker, 3)
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith(".tmp")])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,271 @@
+import bisect
+import collections
+import functools
+import os
+import sys
+import threading
+import time
+from flask import Response, g, request
+
+# Constants
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+MAX_PROFILE_SECONDS = 60.0
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self.lock:
+            self.value += amount
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+class Timer:
+    __slots__ = ('histogram', 'start')
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+class NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = NullTimer()
+
+class MetricsRegistry:
+    # Metric families keyed by name, each holding one child per label set.
+    # When disabled, timer() hands out a shared no-op context manager and
+    # timed() wrappers call straight through, so hooks cost one flag check.
+    def __init__(self, enabled=METRICS_ENABLED):
+        self.enabled = enabled
+        self.families = {}
+        self.lock = threading.Lock()
+
+    def _child(self, kind, name, documentation, labels, factory):
+        key = tuple(sorted(labels.items()))
+        family = self.families.get(name)
+        if family is None:
+            with self.lock:
+                family = self.families.setdefault(name, (kind, documentation, {}))
+        children = family[2]
+        child = children.get(key)
+        if child is None:
+            with self.lock:
+                child = children.setdefault(key, factory())
+        return child
+
+    def counter(self, name, documentation="", **labels):
+        return self._child('counter', name, documentation, labels, Counter)
+
+    def histogram(self, name, documentation="", buckets=DEFAULT_BUCKETS, **labels):
+        return self._child('histogram', name, documentation, labels, lambda: Histogram(buckets))
+
+    def inc(self, name, amount=1.0, documentation="", **labels):
+        if self.enabled:
+            self.counter(name, documentation, **labels).inc(amount)
+
+    def observe(self, name, value, documentation="", **labels):
+        if self.enabled:
+            self.histogram(name, documentation, **labels).observe(value)
+
+    def timer(self, name, documentation="", **labels):
+        if not self.enabled:
+            return NULL_TIMER
+        return Timer(self.histogram(name, documentation, **labels))
+
+    def timed(self, name, documentation="", **labels):
+        def decorator(f):
+            histogram = self.histogram(name, documentation, **labels)
+
+            @functools.wraps(f)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return f(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return f(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    # Prometheus text exposition format, version 0.0.4
+    def render(self):
+        lines = []
+        for name, (kind, documentation, children) in sorted(self.families.items()):
+            if documentation:
+                lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, child in sorted(children.items()):
+                if kind == 'counter':
+                    lines.append(f"{name}{format_labels(key)} {child.value!r}")
+                    continue
+                with child.lock:
+                    counts, total, count = list(child.counts), child.sum, child.count
+                cumulative = 0
+                for bound, bucket_count in zip(child.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float('inf') else repr(bound)
+                    lines.append(f"{name}_bucket{format_labels(key + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{format_labels(key)} {total!r}")
+                lines.append(f"{name}_count{format_labels(key)} {count}")
+        return "\n".join(lines) + "\n"
+
+def format_labels(key):
+    if not key:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in key)
+    return "{" + ",".join(f'{label}="{value}"' for (label, _), value in zip(key, escaped)) + "}"
+
+REGISTRY = MetricsRegistry()
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+inc = REGISTRY.inc
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+render = REGISTRY.render
+
+# Samples every other thread's stack each interval and returns them in the
+# collapsed "frame;frame;frame count" format read by flamegraph.pl and
+# speedscope. Runs in the calling thread, so nothing is running when idle.
+def sample_profile(seconds=5.0, interval=0.005):
+    stacks = collections.Counter()
+    me = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == me:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stacks[";".join(reversed(stack))] += 1
+        time.sleep(interval)
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+# Times every Flask route by its rule and adds GET /metrics; with profiling
+# also GET /debug/profile?seconds=N. Each server worker process keeps its
+# own registry, so /metrics reports the worker that answered.
+def instrument_app(app, registry=REGISTRY, profiling=PROFILING_ENABLED):
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None and registry.enabled:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            registry.observe('http_request_duration_seconds', time.perf_counter() - start,
+                             "HTTP request latency by route", route=route, method=request.method)
+            registry.inc('http_requests_total', 1, "HTTP requests by route and status",
+                         route=route, method=request.method, status=str(response.status_code))
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+    if profiling:
+        @app.route('/debug/profile', methods=['GET'])
+        def profile():
+            seconds = min(float(request.args.get('seconds', 5.0)), MAX_PROFILE_SECONDS)
+            return Response(sample_profile(seconds), mimetype='text/plain')
+
+    return app
+
+import unittest
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_render_counters_and_histograms(self):
+        registry = MetricsRegistry(enabled=True)
+        registry.inc('jobs_total', 2, "Jobs run", kind='a')
+        with registry.timer('step_seconds', "Step latency"):
+            pass
+        registry.observe('step_seconds', 0.2)
+        text = registry.render()
+        self.assertIn('# TYPE jobs_total counter', text)
+        self.assertIn('jobs_total{kind="a"} 2.0', text)
+        self.assertIn('step_seconds_bucket{le="0.25"} 2', text)
+        self.assertIn('step_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('step_seconds_count 2', text)
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry(enabled=False)
+        self.assertIs(registry.timer('step_seconds'), NULL_TIMER)
+
+        @registry.timed('call_seconds')
+        def call(x):
+            return x + 1
+
+        self.assertEqual(call(1), 2)
+        registry.inc('jobs_total')
+        self.assertEqual(registry.histogram('call_seconds').count, 0)
+        self.assertNotIn('jobs_total', registry.render())
+
+    def test_sampling_profiler_sees_busy_thread(self):
+        stop = threading.Event()
+
+        def busy_loop():
+            while not stop.is_set():
+                sum(range(1000))
+
+        thread = threading.Thread(target=busy_loop)
+        thread.start()
+        try:
+            profile = sample_profile(seconds=0.2, interval=0.001)
+        finally:
+            stop.set()
+            thread.join()
+        self.assertIn("busy_loop (instrumentation.py", profile)
+
+    def test_flask_routes_are_timed(self):
+        from flask import Flask
+        registry = MetricsRegistry(enabled=True)
+        app = instrument_app(Flask(__name__), registry, profiling=True)
+
+        @app.route('/items/<int:item>')
+        def item(item):
+            return str(item)
+
+        client = app.test_client()
+        client.get('/items/1')
+        client.get('/items/2')
+        text = client.get('/metrics').get_data(as_text=True)
+        self.assertIn('http_requests_total{method="GET",route="/items/<int:item>",status="200"} 2.0', text)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="/items/<int:item>"} 2', text)
+        self.assertEqual(client.get('/debug/profile?seconds=0.05').status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
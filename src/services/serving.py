@@ -0,0 +1,61 @@
+import os
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = None
+
+# Constants
+SERVE_WORKERS = int(os.environ.get("SERVE_WORKERS", os.cpu_count() or 1))
+SERVE_THREADS = int(os.environ.get("SERVE_THREADS", 4))
+
+# gunicorn application serving an already built Flask app with gthread
+# workers. With preload the app is loaded once in the master and shared
+# copy-on-write by the forked workers; post_fork then runs in each worker,
+# which is where anything holding threads or TensorFlow state is started.
+def application(app, bind, post_fork=None, workers=SERVE_WORKERS, threads=SERVE_THREADS, preload=True):
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', bind)
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('preload_app', preload)
+            if post_fork is not None:
+                self.cfg.set('post_fork', lambda server, worker: post_fork())
+
+        def load(self):
+            return app
+
+    return Application()
+
+# Production serving for both services; falls back to a single process
+# werkzeug server when gunicorn is not installed
+def serve(app, bind, post_fork=None, workers=SERVE_WORKERS, threads=SERVE_THREADS, preload=True):
+    if BaseApplication is None:
+        from werkzeug.serving import run_simple
+        if post_fork is not None:
+            post_fork()
+        host, port = bind.rsplit(":", 1)
+        run_simple(host, int(port), app, threaded=True)
+        return
+    application(app, bind, post_fork, workers, threads, preload).run()
+
+import unittest
+
+@unittest.skipIf(BaseApplication is None, "gunicorn is not installed")
+class TestApplication(unittest.TestCase):
+    def test_gthread_config(self):
+        from flask import Flask
+        flask_app = Flask(__name__)
+        started = []
+        gunicorn_app = application(flask_app, "127.0.0.1:5999", post_fork=lambda: started.append(True), workers=3, threads=2)
+        self.assertEqual(gunicorn_app.cfg.bind, ["127.0.0.1:5999"])
+        self.assertEqual((gunicorn_app.cfg.workers, gunicorn_app.cfg.threads), (3, 2))
+        self.assertEqual(gunicorn_app.cfg.worker_class_str, "gthread")
+        self.assertTrue(gunicorn_app.cfg.preload_app)
+        self.assertIs(gunicorn_app.load(), flask_app)
+        gunicorn_app.cfg.post_fork(None, None)
+        self.assertEqual(started, [True])
+
+if __name__ == '__main__':
+    unittest.main()